@@ -24,6 +24,7 @@ from utilities import (
     load_state,
     initDir,
     load_optimal,
+    path_epochs,
 )
 
 
@@ -53,6 +54,8 @@ def centralized_algo(
     algo,
     gap_type,
     use_smoother,
+    test_eval=None,
+    executor=None,
 ):
     exp_save_path = f"{exp_log_path}/central_{algo}"
     initDir(exp_save_path)
@@ -79,111 +82,45 @@ def centralized_algo(
 
     exp_names = []
     legends = []
+    jobs = []
     for idx, (epoch, bz, lr) in enumerate(params):
         exp_names.append(f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_{gap_type}.npy")
         if lr_staged:
             legends.append(f"{algo}: bz = {bz}, lr = {C_lr_list}")
         else:
             legends.append(f"{algo}: bz = {bz}, lr = {lr}")
-        model_para = model_para_cp
-        print(f"\n{'-'*50}")
-        print(f"Running {algo} with epoch = {epoch}, batch size = {bz}, lr = {lr}")
-        print(f"{'-'*50}")
 
         if os.path.exists(f"{exp_save_path}/{exp_names[-1]}"):
             print(f"Already exists {exp_save_path}/{exp_names[-1]}")
             continue
-        if train_load:
-            model_para = load_optimal(
-                exp_save_path, f"{algo}_opt_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy"
-            )
-
-        if algo == "SGD":
-            theta, theta_opt, F_opt = copt.SGD(
-                logis_model,
-                lr,
-                epoch,
-                model_para,
-                bz,
-                C_lr_dec,
-                lr_staged,
-                train_log_path,
-                f"{algo}_bz{bz}_lr_staged_check"
-                if lr_staged
-                else f"{algo}_bz{bz}_lr{lr:.3f}_check",
-                save_every,
-                error_lr,
-                stop_at_converge=stop_at_convergence,
-                lr_list=C_lr_list,
-                lr_dec_epochs=C_lr_dec_epochs,
-                node_num=node_num,
-            )
-        elif algo == "CRR":
-            theta, theta_opt, F_opt = copt.C_RR(
-                logis_model,
-                lr,
-                epoch,
-                model_para,
-                bz,
-                C_lr_dec,
-                lr_staged,
-                train_log_path,
-                f"{algo}_bz{bz}_lr_staged_check"
-                if lr_staged
-                else f"{algo}_bz{bz}_lr{lr:.3f}_check",
-                save_every,
-                error_lr,
-                stop_at_converge=stop_at_convergence,
-                lr_list=C_lr_list,
-                lr_dec_epochs=C_lr_dec_epochs,
+        jobs.append(
+            dict(
+                model_para=model_para_cp,
+                epoch=epoch,
+                bz=bz,
+                lr=lr,
+                algo=algo,
                 node_num=node_num,
+                C_lr_dec=C_lr_dec,
+                C_lr_list=C_lr_list,
+                C_lr_dec_epochs=C_lr_dec_epochs,
+                exp_save_path=exp_save_path,
+                train_log_path=train_log_path,
+                save_every=save_every,
+                train_load=train_load,
+                save_theta_path=save_theta_path,
+                stop_at_convergence=stop_at_convergence,
             )
-
-        F_loss = logis_model.F_val(np.array(theta))
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_loss.npy",
-            F_loss,
         )
 
-        np.save(
-            f"{exp_save_path}/{algo}_opt_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy",
-            theta_opt,
-        )
-
-        res_F = error_lr.cost_gap_path(theta, gap_type="theta")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_theta1.npy",
-            res_F,
-        )
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_theta2.npy",
-            res_F,
-        )
-        res_F_F = error_lr.cost_gap_path(theta, gap_type="F")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_F.npy", res_F_F
-        )
-        res_F_grad = error_lr.cost_gap_path(theta, gap_type="grad")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_grad1.npy",
-            res_F_grad,
-        )
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_grad2.npy",
-            res_F_grad,
-        )
-        res_F_concensus = error_lr.cost_gap_path(theta, gap_type="consensus")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_consensus.npy",
-            res_F_concensus,
+    if executor is None:
+        for job in jobs:
+            centralized_run(logis_model, error_lr, test_eval, **job)
+    else:
+        executor.map(
+            centralized_run, jobs, shared=("logis_model", "error_lr", "test_eval")
         )
 
-        if save_theta_path:
-            np.save(
-                f"{exp_save_path}/{algo}_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy",
-                theta,
-            )
-
     if not os.path.exists(f"{exp_save_path}/convergence_{algo}_theta1_{exp_name}.pdf"):
         plot_figure_path(
             exp_save_path,
@@ -282,6 +219,13 @@ def decentralized_algo(
     gap_type,
     use_smoother,
     comm_every_epoch,
+    test_eval=None,
+    eval_nodes=False,
+    executor=None,
+    ensemble=False,
+    compression=None,
+    adaptive=None,
+    event=None,
 ):
     exp_save_path = f"{exp_log_path}/{algo}"
     initDir(exp_save_path)
@@ -298,6 +242,19 @@ def decentralized_algo(
     if lr_staged:
         assert D_lr is None, "No learning rate when staged learning rate is specified"
 
+    pairs = getattr(logis_model, "pairs", None)  # multi-pair problem, see Problems.multi_pair
+    if pairs is None:
+        save_paths = [exp_save_path]
+    else:
+        if ensemble or executor is not None:
+            raise ValueError(
+                "multi-pair problems already run as one ensemble and run in-process"
+            )
+        pair_names = [logis_model.pair_name(e) for e in range(len(pairs))]
+        save_paths = [f"{exp_save_path}/{pair_name}" for pair_name in pair_names]
+        for save_path in save_paths:
+            initDir(save_path)
+
     params = []
     if lr_staged:
         for idx, bz in enumerate(D_batch_size):
@@ -311,220 +268,609 @@ def decentralized_algo(
 
     exp_names = []
     legends = []
+    jobs = []
     for idx, (epoch, bz, lr, cr) in enumerate(params):
         exp_names.append(
-            f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_{gap_type}.npy"
+            f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_{gap_type}.npy"
         )
         if lr_staged:
             legends.append(f"{algo}: bz = {bz}, ur = {cr}, lr = {D_lr_list}")
         else:
             legends.append(f"{algo}: bz = {bz}, ur = {cr}, lr = {lr}")
-        model_para = model_para_cp
-        print(f"\n{'-'*50}")
-        print(
-            f"Running {algo} with epoch = {epoch}, batch size = {bz}, lr = {lr}, ur = {cr}"
-        )
-        print(f"{'-'*50}")
 
-        if os.path.exists(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_{gap_type}.npy"
-        ):
-            print(
-                f"Already exists {exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_{gap_type}.npy"
-            )
+        if all(os.path.exists(f"{save_path}/{exp_names[-1]}") for save_path in save_paths):  # every pair
+            print(f"Already exists {save_paths[-1]}/{exp_names[-1]}")
             continue
-        if train_load:
-            model_para = load_optimal(
-                exp_save_path, f"{algo}_opt_theta_bz{bz}_lr{lr:.6f}_ur{cr}.npy"
-            )
-
-        if algo == "DSGD":
-            theta_D = dopt.D_SGD(
-                logis_model,
-                communication_matrix,
-                lr,
-                int(epoch),
-                model_para,
-                bz,
-                cr,
-                D_lr_dec,
-                lr_staged,
-                grad_track,
-                train_log_path,
-                f"{algo}_bz{bz}_ur{cr}_lr{lr}",
-                save_every,
-                error_lr,
-                stop_at_converge=stop_at_convergence,
+        jobs.append(
+            dict(
+                model_para=model_para_cp,
+                epoch=epoch,
+                bz=bz,
+                lr=lr,
+                cr=cr,
+                algo=algo,
                 comm_type=comm_type,
-                lr_list=D_lr_list,
-                lr_dec_epochs=D_lr_dec_epochs,
-            )
-        elif algo == "DRR":
-            theta_D = dopt.D_RR(
-                logis_model,
-                communication_matrix,
-                lr,
-                int(epoch),
-                model_para,
-                bz,
-                cr,
-                D_lr_dec,
-                lr_staged,
-                grad_track,
-                train_log_path,
-                f"{algo}_bz{bz}_ur{cr}_lr{lr}",
-                save_every,
-                error_lr,
-                stop_at_converge=stop_at_convergence,
-                comm_type=comm_type,
-                lr_list=D_lr_list,
-                lr_dec_epochs=D_lr_dec_epochs,
+                grad_track=grad_track,
                 exact_diff=exact_diff,
                 comm_every_epoch=comm_every_epoch,
+                D_lr_dec=D_lr_dec,
+                D_lr_list=D_lr_list,
+                D_lr_dec_epochs=D_lr_dec_epochs,
+                exp_save_path=exp_save_path,
+                train_log_path=train_log_path,
+                save_every=save_every,
+                train_load=train_load,
+                save_theta_path=save_theta_path,
+                stop_at_convergence=stop_at_convergence,
+                eval_nodes=eval_nodes,
+                compression=compression,
+                adaptive=adaptive,
+                event=event,
             )
+        )
 
-        F_loss = logis_model.F_val(np.array(theta_D))
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_loss.npy",
-            F_loss,
+    if ensemble and not lr_staged:
+        # configurations differing only in lr run as one ensemble job
+        grouped = {}
+        for job in jobs:
+            key = (job["epoch"], job["bz"], job["cr"])
+            if key in grouped:
+                grouped[key]["lr"].append(job["lr"])
+            else:
+                grouped[key] = dict(job, lr=[job["lr"]])
+        jobs = list(grouped.values())
+
+    if executor is None:
+        for job in jobs:
+            decentralized_run(
+                logis_model, communication_matrix, error_lr, test_eval, **job
+            )
+    else:
+        executor.map(
+            decentralized_run,
+            jobs,
+            shared=("logis_model", "communication_matrix", "error_lr", "test_eval"),
         )
 
-        res_F_D = error_lr.cost_gap_path(theta_D, gap_type="theta")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_theta1.npy",
-            res_F_D,
+    for save_path in save_paths:
+        if not os.path.exists(f"{save_path}/convergence_{algo}_theta1_{exp_name}.pdf"):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_theta1.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_theta1_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+        if not os.path.exists(f"{save_path}/convergence_{algo}_theta2_{exp_name}.pdf"):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_theta2.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_theta2_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+        if not os.path.exists(f"{save_path}/convergence_{algo}_F_{exp_name}.pdf"):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_F.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_F_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+        if not os.path.exists(f"{save_path}/convergence_{algo}_grad1_{exp_name}.pdf"):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_grad1.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_grad1_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+        if not os.path.exists(f"{save_path}/convergence_{algo}_grad2_{exp_name}.pdf"):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_grad2.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_grad2_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+        if not os.path.exists(
+            f"{save_path}/convergence_{algo}_consensus_{exp_name}.pdf"
+        ):
+            plot_figure_path(
+                save_path,
+                [
+                    f"{algo}_gap_epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}_consensus.npy"
+                    for idx, (epoch, bz, lr, cr) in enumerate(params)
+                ],
+                line_formats,
+                legends,
+                f"{save_path}/convergence_{algo}_consensus_{exp_name}.pdf",
+                plot_every,
+                mark_every,
+                plot_first,
+                use_smoother,
+            )
+
+    if pairs is None:
+        exp_names = [f"{algo}/{name}" for name in exp_names]
+    else:
+        legends = [
+            f"{legend}, {pair_name}" for pair_name in pair_names for legend in legends
+        ]
+        exp_names = [
+            f"{algo}/{pair_name}/{name}" for pair_name in pair_names for name in exp_names
+        ]
+    return exp_names, legends
+
+
+def centralized_run(
+    logis_model,
+    error_lr,
+    test_eval,
+    model_para,
+    epoch,
+    bz,
+    lr,
+    algo,
+    node_num,
+    C_lr_dec,
+    C_lr_list,
+    C_lr_dec_epochs,
+    exp_save_path,
+    train_log_path,
+    save_every,
+    train_load,
+    save_theta_path,
+    stop_at_convergence,
+):
+    """
+    Train one (epoch, bz, lr) configuration of a centralized sweep and save
+    its gap files. Called in-process by centralized_algo, or in a worker
+    process by a sweep.SweepExecutor.
+    """
+    lr_staged = C_lr_list is not None
+    print(f"\n{'-'*50}")
+    print(f"Running {algo} with epoch = {epoch}, batch size = {bz}, lr = {lr}")
+    print(f"{'-'*50}")
+
+    if train_load:
+        model_para = load_optimal(
+            exp_save_path, f"{algo}_opt_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy"
         )
-        res_F_D = error_lr.cost_gap_path(
-            np.sum(theta_D, axis=1) / logis_model.n, gap_type="theta"
+
+    if algo == "SGD":
+        theta, theta_opt, F_opt = copt.SGD(
+            logis_model,
+            lr,
+            epoch,
+            model_para,
+            bz,
+            C_lr_dec,
+            lr_staged,
+            train_log_path,
+            f"{algo}_bz{bz}_lr_staged_check"
+            if lr_staged
+            else f"{algo}_bz{bz}_lr{lr:.3f}_check",
+            save_every,
+            error_lr,
+            stop_at_converge=stop_at_convergence,
+            lr_list=C_lr_list,
+            lr_dec_epochs=C_lr_dec_epochs,
+            node_num=node_num,
         )
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_theta2.npy",
-            res_F_D,
+    elif algo == "CRR":
+        theta, theta_opt, F_opt = copt.C_RR(
+            logis_model,
+            lr,
+            epoch,
+            model_para,
+            bz,
+            C_lr_dec,
+            lr_staged,
+            train_log_path,
+            f"{algo}_bz{bz}_lr_staged_check"
+            if lr_staged
+            else f"{algo}_bz{bz}_lr{lr:.3f}_check",
+            save_every,
+            error_lr,
+            stop_at_converge=stop_at_convergence,
+            lr_list=C_lr_list,
+            lr_dec_epochs=C_lr_dec_epochs,
+            node_num=node_num,
         )
 
-        res_F_D_F = error_lr.cost_gap_path(
-            np.sum(theta_D, axis=1) / logis_model.n, gap_type="F"
-        )
+    F_loss = logis_model.F_val(np.array(theta))
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_loss.npy",
+        F_loss,
+    )
+
+    np.save(
+        f"{exp_save_path}/{algo}_opt_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy",
+        theta_opt,
+    )
+
+    res_F = error_lr.cost_gap_path(theta, gap_type="theta")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_theta1.npy",
+        res_F,
+    )
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_theta2.npy",
+        res_F,
+    )
+    res_F_F = error_lr.cost_gap_path(theta, gap_type="F")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_F.npy", res_F_F
+    )
+    res_F_grad = error_lr.cost_gap_path(theta, gap_type="grad")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_grad1.npy",
+        res_F_grad,
+    )
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_grad2.npy",
+        res_F_grad,
+    )
+    res_F_concensus = error_lr.cost_gap_path(theta, gap_type="consensus")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_consensus.npy",
+        res_F_concensus,
+    )
+
+    if test_eval is not None:
+        test_loss, test_err = test_eval.loss_error_path(theta)
         np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_F.npy",
-            res_F_D_F,
-        )
-        res_F_D_grad = error_lr.cost_gap_path(
-            np.sum(theta_D, axis=1) / logis_model.n, gap_type="grad"
+            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_testloss.npy",
+            test_loss,
         )
         np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_grad1.npy",
-            res_F_D_grad,
+            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_testerr.npy",
+            test_err,
         )
-        res_F_D_grad = error_lr.cost_gap_path(theta_D, gap_type="grad")
+
+    if save_theta_path:
         np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_grad2.npy",
-            res_F_D_grad,
+            f"{exp_save_path}/{algo}_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}.npy",
+            theta,
         )
-        res_F_D_concensus = error_lr.cost_gap_path(theta_D, gap_type="consensus")
-        np.save(
-            f"{exp_save_path}/{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_consensus.npy",
-            res_F_D_concensus,
+
+
+def batch_label(logis_model, bz):
+    """
+    Batch size in the file names of decentralized runs. A multi-pair problem
+    (Problems.multi_pair.LR_pairs) draws bz samples over the union of its
+    classes, about 2 bz / classes per pair, so its names carry the number
+    of classes: bz{bz}shared{classes}.
+    """
+    if getattr(logis_model, "pairs", None) is None:
+        return f"{bz}"
+    return f"{bz}shared{len(logis_model.classes)}"
+
+
+def decentralized_run(
+    logis_model,
+    communication_matrix,
+    error_lr,
+    test_eval,
+    model_para,
+    epoch,
+    bz,
+    lr,
+    cr,
+    algo,
+    comm_type,
+    grad_track,
+    exact_diff,
+    comm_every_epoch,
+    D_lr_dec,
+    D_lr_list,
+    D_lr_dec_epochs,
+    exp_save_path,
+    train_log_path,
+    save_every,
+    train_load,
+    save_theta_path,
+    stop_at_convergence,
+    eval_nodes=False,
+    path_every=1,
+    compression=None,
+    adaptive=None,
+    event=None,
+):
+    """
+    Train one (epoch, bz, lr, cr) configuration of a decentralized sweep and
+    save its gap files. Called in-process by decentralized_algo, or in a
+    worker process by a sweep.Sweep_executor. If lr is a list, all its
+    learning rates run as one ensemble (see DOPTIMIZER.D_ensemble) and each
+    member is saved as its own configuration.
+
+    For a multi-pair problem (Problems.multi_pair.LR_pairs) the pairs are
+    the ensemble, error_lr and test_eval are the analysis classes (or None
+    for test_eval), instantiated once per pair, and every pair is saved in
+    its own sub-directory of exp_save_path.
+    """
+    lr_staged = D_lr_list is not None
+    print(f"\n{'-'*50}")
+    print(
+        f"Running {algo} with epoch = {epoch}, batch size = {bz}, lr = {lr}, ur = {cr}"
+    )
+    print(f"{'-'*50}")
+
+    pairs = getattr(logis_model, "pairs", None)
+    ensemble = isinstance(lr, (list, tuple))  # learning rates advanced together
+    if pairs is not None and ensemble:
+        raise ValueError("learning rate ensembles of multi-pair problems are not supported")
+    lrs = list(lr) if ensemble else [lr]
+    if train_load:
+        model_para = [
+            load_optimal(
+                exp_save_path, f"{algo}_opt_theta_bz{bz}_lr{lr_e:.6f}_ur{cr}.npy"
+            )
+            for lr_e in lrs
+        ]
+    else:
+        model_para = [model_para for lr_e in lrs]
+    if ensemble:
+        model_para, lr = np.array(model_para), np.array(lrs)
+    elif pairs is not None:
+        model_para = np.array([model_para[0] for pair in pairs])
+    else:
+        model_para = model_para[0]
+
+    round_counts = {}  # gossip rounds by kind, bytes sent and per-node ledger, per epoch
+    if algo == "DSGD":
+        theta_D = dopt.D_SGD(
+            logis_model,
+            communication_matrix,
+            lr,
+            int(epoch),
+            model_para,
+            bz,
+            cr,
+            D_lr_dec,
+            lr_staged,
+            grad_track,
+            train_log_path,
+            f"{algo}_bz{bz}_ur{cr}_lr{lr}",
+            save_every,
+            error_lr,
+            stop_at_converge=stop_at_convergence,
+            comm_type=comm_type,
+            lr_list=D_lr_list,
+            lr_dec_epochs=D_lr_dec_epochs,
+            path_every=path_every,
+            round_counts=round_counts,
+            compression=compression,
+            adaptive=adaptive,
+            event=event,
+        )
+    elif algo == "DRR":
+        theta_D = dopt.D_RR(
+            logis_model,
+            communication_matrix,
+            lr,
+            int(epoch),
+            model_para,
+            bz,
+            cr,
+            D_lr_dec,
+            lr_staged,
+            grad_track,
+            train_log_path,
+            f"{algo}_bz{bz}_ur{cr}_lr{lr}",
+            save_every,
+            error_lr,
+            stop_at_converge=stop_at_convergence,
+            comm_type=comm_type,
+            lr_list=D_lr_list,
+            lr_dec_epochs=D_lr_dec_epochs,
+            exact_diff=exact_diff,
+            comm_every_epoch=comm_every_epoch,
+            path_every=path_every,
+            round_counts=round_counts,
+            compression=compression,
+            adaptive=adaptive,
+            event=event,
         )
 
-        if save_theta_path:
-            np.save(
-                f"{exp_save_path}/{algo}_theta_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}.npy",
-                theta_D,
+    epochs = path_epochs(int(epoch), path_every, len(theta_D))
+    if pairs is not None:
+        for e, theta_e in enumerate(np.swapaxes(np.array(theta_D), 0, 1)):
+            view = logis_model.pair_view(e)
+            theta_opt = logis_model.theta_opt[e]
+            save_decentralized_gaps(
+                view,
+                error_lr(view, theta_opt, view.F_val(theta_opt)),
+                None if test_eval is None else test_eval(view),
+                theta_e,
+                f"{exp_save_path}/{logis_model.pair_name(e)}",
+                algo,
+                f"epoch{epoch}_bz{batch_label(logis_model, bz)}_lr{lr:.6f}_ur{cr}",
+                eval_nodes,
+                save_theta_path,
+                member_counts(round_counts, e),
+                epochs,
             )
+        return
 
-    if not os.path.exists(f"{exp_save_path}/convergence_{algo}_theta1_{exp_name}.pdf"):
-        plot_figure_path(
+    if ensemble:
+        members = list(np.swapaxes(np.array(theta_D), 0, 1))
+    else:
+        members = [theta_D]
+    for e, (lr_e, theta_e) in enumerate(zip(lrs, members)):
+        save_decentralized_gaps(
+            logis_model,
+            error_lr,
+            test_eval,
+            theta_e,
             exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_theta1.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_theta1_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+            algo,
+            f"epoch{epoch}_bz{bz}_lr{lr_e:.6f}_ur{cr}",
+            eval_nodes,
+            save_theta_path,
+            member_counts(round_counts, e) if ensemble else round_counts,
+            epochs,
         )
-    if not os.path.exists(f"{exp_save_path}/convergence_{algo}_theta2_{exp_name}.pdf"):
-        plot_figure_path(
-            exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_theta2.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_theta2_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+
+
+def member_counts(round_counts, e):
+    """
+    round_counts of member e of an ensemble: the entries with a member axis
+    (bytes, commtime and the node ledger, see schedule.Gossip) are sliced,
+    the shared ones (rounds by kind, mixtime) are kept.
+    """
+    counts = {}
+    for key, values in round_counts.items():
+        values = np.array([np.broadcast_to(value, np.shape(values[-1])) for value in values])
+        shared_ndim = 2 if key.startswith("node") else 1
+        counts[key] = values[:, e] if values.ndim > shared_ndim else values
+    return counts
+
+
+def save_decentralized_gaps(
+    logis_model,
+    error_lr,
+    test_eval,
+    theta_D,
+    exp_save_path,
+    algo,
+    config,
+    eval_nodes=False,
+    save_theta_path=False,
+    round_counts=None,
+    epochs=None,
+):
+    """
+    Save the gap files of one decentralized training path. File names are
+    f"{algo}_gap_{config}_{gap_type}.npy" inside exp_save_path. Per-node
+    results of a problem with reordered nodes (reorder.Node_ordering) are
+    saved in the original node labels. round_counts (gossip rounds by kind,
+    bytes sent and the per-node ledger per epoch, see DOPTIMIZER.D_RR) are
+    saved as gaps, and so are the epochs of the points of a path thinned by
+    path_every (see utilities.path_epochs), which plot_figure_path uses as
+    its x axis.
+    """
+    ordering = getattr(logis_model, "node_ordering", None)
+    F_loss = logis_model.F_val(np.array(theta_D))
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_loss.npy",
+        F_loss,
+    )
+
+    res_F_D = error_lr.cost_gap_path(theta_D, gap_type="theta")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_theta1.npy",
+        res_F_D,
+    )
+    res_F_D = error_lr.cost_gap_path(
+        np.sum(theta_D, axis=1) / logis_model.n, gap_type="theta"
+    )
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_theta2.npy",
+        res_F_D,
+    )
+
+    res_F_D_F = error_lr.cost_gap_path(
+        np.sum(theta_D, axis=1) / logis_model.n, gap_type="F"
+    )
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_F.npy",
+        res_F_D_F,
+    )
+    res_F_D_grad = error_lr.cost_gap_path(
+        np.sum(theta_D, axis=1) / logis_model.n, gap_type="grad"
+    )
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_grad1.npy",
+        res_F_D_grad,
+    )
+    res_F_D_grad = error_lr.cost_gap_path(theta_D, gap_type="grad")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_grad2.npy",
+        res_F_D_grad,
+    )
+    res_F_D_concensus = error_lr.cost_gap_path(theta_D, gap_type="consensus")
+    np.save(
+        f"{exp_save_path}/{algo}_gap_{config}_consensus.npy",
+        res_F_D_concensus,
+    )
+
+    if test_eval is not None:
+        test_loss, test_err = test_eval.loss_error_path(
+            theta_D, per_node=eval_nodes
         )
-    if not os.path.exists(f"{exp_save_path}/convergence_{algo}_F_{exp_name}.pdf"):
-        plot_figure_path(
-            exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_F.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_F_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+        if eval_nodes:
+            np.save(
+                f"{exp_save_path}/{algo}_gap_{config}_testlossnodes.npy",
+                test_loss[:, 1:] if ordering is None else ordering.restore_nodes(test_loss[:, 1:]),
+            )
+            np.save(
+                f"{exp_save_path}/{algo}_gap_{config}_testerrnodes.npy",
+                test_err[:, 1:] if ordering is None else ordering.restore_nodes(test_err[:, 1:]),
+            )
+            test_loss, test_err = test_loss[:, 0], test_err[:, 0]
+        np.save(
+            f"{exp_save_path}/{algo}_gap_{config}_testloss.npy",
+            test_loss,
         )
-    if not os.path.exists(f"{exp_save_path}/convergence_{algo}_grad1_{exp_name}.pdf"):
-        plot_figure_path(
-            exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_grad1.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_grad1_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+        np.save(
+            f"{exp_save_path}/{algo}_gap_{config}_testerr.npy",
+            test_err,
         )
-    if not os.path.exists(f"{exp_save_path}/convergence_{algo}_grad2_{exp_name}.pdf"):
-        plot_figure_path(
-            exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_grad2.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_grad2_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+
+    if epochs is not None:
+        np.save(
+            f"{exp_save_path}/{algo}_gap_{config}_epochs.npy",
+            epochs,
         )
-    if not os.path.exists(
-        f"{exp_save_path}/convergence_{algo}_consensus_{exp_name}.pdf"
-    ):
-        plot_figure_path(
-            exp_save_path,
-            [
-                f"{algo}_gap_epoch{epoch}_bz{bz}_lr{lr:.6f}_ur{cr}_consensus.npy"
-                for idx, (epoch, bz, lr, cr) in enumerate(params)
-            ],
-            line_formats,
-            legends,
-            f"{exp_save_path}/convergence_{algo}_consensus_{exp_name}.pdf",
-            plot_every,
-            mark_every,
-            plot_first,
-            use_smoother,
+
+    for key, counts in (round_counts or {}).items():
+        counts = np.array(counts)
+        if ordering is not None and key.startswith("node"):
+            counts = ordering.restore_nodes(counts)
+        np.save(
+            f"{exp_save_path}/{algo}_gap_{config}_{key}.npy",
+            counts,
         )
 
-    exp_names = [f"{algo}/{name}" for name in exp_names]
-    return exp_names, legends
+    if save_theta_path:
+        np.save(
+            f"{exp_save_path}/{algo}_theta_{config}.npy",
+            theta_D if ordering is None else ordering.restore(theta_D),
+        )
@@ -16,6 +16,8 @@ from utilities import (
     model_converged,
 )
 from analysis import error
+from schedule import Gossip, Ring_all_reduce, Consensus_control, record_rounds
+from compression import Event_trigger
 
 
 def D_SGD(
@@ -37,22 +39,64 @@ def D_SGD(
     comm_type="graph_avg",
     lr_list=None,
     lr_dec_epochs=None,
+    path_every=1,
+    seeds=None,
+    round_counts=None,
+    compression=None,
+    adaptive=None,
+    event=None,
 ):
     """
     Distributed SGD Optimizer
 
     @param
     :prd                logistic model object
-    :weight             the column stocastic weight matrix used to represent the graph network
+    :weight             the column stocastic weight matrix used to represent the graph network,
+                        or a schedule.Gossip_schedule of time-varying matrices
     :learning_rate      learning rate
     :K                  number of epochs
     :theta_0            parameters of the logistic function (each row stands for one distributed node's param)
     :batch_size         batch size of mini-batch SGD
     :comm_round         gradient info communication perioid
+    :path_every         keep every path_every-th epoch (and the last one) in the returned path
+    :seeds              per-member seeds of the sample streams (ensemble mode only)
+    :round_counts       dict filled at the end of each epoch with the cumulative number of gossip rounds
+                        (parameters and gradient tracker) of every kind (see schedule.Gossip_schedule.kinds)
+                        and what was sent, in total and by every node (see schedule.record_rounds)
+    :compression        compression.Choco settings of comm_type "choco" (compressed gossip of the parameters
+                        with error feedback; the gradient tracker is gossiped uncompressed)
+    :adaptive           schedule.Consensus_control settings of comm_type "adaptive" (period and rounds of the
+                        gossip adapted to the consensus error, starting from comm_round; default settings if None;
+                        the controller acts between steps, so not with comm_every_epoch)
+    :event              compression.Event_trigger settings of comm_type "event" (nodes broadcast only when their
+                        parameters moved by more than a threshold, neighbors reuse the last copy; default if None)
+
+    A 3-D theta_0 of shape (E, n, p) runs E configurations together, see
+    D_ensemble.
 
     @return
     :theta              list of logistic function parameters along the training
     """
+    if np.ndim(theta_0) == 3:
+        return D_ensemble(
+            prd,
+            weight,
+            learning_rate,
+            K,
+            theta_0,
+            batch_size,
+            comm_round,
+            lr_dec,
+            lr_staged,
+            grad_track,
+            comm_type=comm_type,
+            path_every=path_every,
+            seeds=seeds,
+            round_counts=round_counts,
+            compression=compression,
+            random_reshuffling=False,
+        )
+
     theta_copy = cp.deepcopy(theta_0)
     theta = [theta_copy]
     if lr_staged:
@@ -68,8 +112,24 @@ def D_SGD(
     grad_track_y = np.zeros(theta_0.shape)
     grad_prev = np.zeros(theta_0.shape)
 
+    if comm_type == "choco" and compression is None:
+        raise ValueError("comm_type choco needs compression settings (compression.Choco)")
+    # rounds applied to the parameters
+    if comm_type == "choco":
+        gossip = compression.gossip(weight)
+    elif comm_type == "event":
+        gossip = (event or Event_trigger()).gossip(weight)
+    elif comm_type == "all_avg":
+        gossip = Ring_all_reduce(prd.n)
+    else:
+        gossip = Gossip(weight)
+    # rounds applied to the gradient tracker
+    track_gossip = Ring_all_reduce(prd.n) if comm_type == "all_avg" else Gossip(weight)
+    if comm_type == "adaptive":
+        control = (adaptive or Consensus_control()).controller(comm_round)
+    temp = theta_copy
     for k in range(K):
-        temp = theta[-1]
+        gossip.start_epoch(k)
         if lr_dec:
             assert lr_staged is False
             learning_rate = 1 / (50 * k + 400)
@@ -102,22 +162,20 @@ def D_SGD(
                 grad = prd.networkgrad(temp, permute=sample_vec, permute_flag=True)
 
                 if grad_track:
-                    grad_track_y = np.matmul(weight, grad_track_y + grad - grad_prev)
+                    grad_track_y = track_gossip(grad_track_y + grad - grad_prev)
                     grad_prev = cp.deepcopy(grad)
                     temp = temp - learning_rate * grad_track_y
                 else:
                     temp = temp - learning_rate * grad
 
-                if comm_round > 0:
+                if comm_type == "adaptive":
+                    temp = control(temp, grad, learning_rate, gossip)
+                elif comm_round > 0:
                     if (i + 1) % comm_round == 0:
                         # averaging from neighbours
                         # this probably caused significant performance drop
-                        if comm_type == "graph_avg":
-                            temp = np.matmul(weight, temp)
-                        elif comm_type == "all_avg":
-                            theta_avg = np.sum(temp, axis=0) / node_num
-                            temp = np.array([theta_avg for i in range(node_num)])
-                            raise NotImplementedError
+                        if comm_type in ("graph_avg", "choco", "event", "all_avg"):
+                            temp = gossip(temp)
                         elif comm_type == "no_comm":
                             pass
                         elif comm_type == "one_shot":
@@ -126,13 +184,13 @@ def D_SGD(
                                 and i == update_round - 1
                                 and node == node_num - 1
                             ):
-                                temp = np.matmul(weight, temp)
+                                temp = gossip(temp)
                                 print("One Shot Communication")
                         else:
                             raise NotImplementedError
                 elif comm_round < 0:
                     for i in range(-comm_round):
-                        temp = np.matmul(weight, temp)
+                        temp = gossip(temp)
                 else:
                     raise ValueError
 
@@ -142,8 +200,10 @@ def D_SGD(
                         print(f"Converged at {k} round")
                         return theta, theta[-1], prd.F_val(theta[-1])
 
+        record_rounds(round_counts, gossip, track_gossip)
         ut.monitor("D_SGD", k, K, track_time)
-        theta.append(cp.deepcopy(temp))
+        if (k + 1) % path_every == 0 or k + 1 == K:
+            theta.append(cp.deepcopy(temp))
 
         if save_every != -1 and ((k + 1) % save_every == 0 or k + 1 == K):
             # save_state(theta, save_path, exp_name)
@@ -184,22 +244,66 @@ def D_RR(
     lr_dec_epochs=None,
     exact_diff=False,
     comm_every_epoch=False,
+    path_every=1,
+    seeds=None,
+    round_counts=None,
+    compression=None,
+    adaptive=None,
+    event=None,
 ):
     """
     Distributed DRR Optimizer
 
     @param
     :prd                logistic model object
-    :weight             the column stocastic weight matrix used to represent the graph network
+    :weight             the column stocastic weight matrix used to represent the graph network,
+                        or a schedule.Gossip_schedule of time-varying matrices
     :learning_rate      learning rate
     :K                  number of epochs
     :theta_0            parameters of the logistic function (each row stands for one distributed node's param)
     :batch_size         batch size of mini-batch DRR
     :comm_round         gradient info communication perioid
+    :path_every         keep every path_every-th epoch (and the last one) in the returned path
+    :seeds              per-member seeds of the sample streams (ensemble mode only)
+    :round_counts       dict filled at the end of each epoch with the cumulative number of gossip rounds
+                        (parameters and gradient tracker) of every kind (see schedule.Gossip_schedule.kinds)
+                        and what was sent, in total and by every node (see schedule.record_rounds)
+    :compression        compression.Choco settings of comm_type "choco" (compressed gossip of the parameters
+                        with error feedback; the gradient tracker is gossiped uncompressed)
+    :adaptive           schedule.Consensus_control settings of comm_type "adaptive" (period and rounds of the
+                        gossip adapted to the consensus error, starting from comm_round; default settings if None;
+                        the controller acts between steps, so not with comm_every_epoch)
+    :event              compression.Event_trigger settings of comm_type "event" (nodes broadcast only when their
+                        parameters moved by more than a threshold, neighbors reuse the last copy; default if None)
+
+    A 3-D theta_0 of shape (E, n, p) runs E configurations together, see
+    D_ensemble.
 
     @return
     :theta_epoch        list of logistic function parameters along the training
     """
+    if np.ndim(theta_0) == 3:
+        return D_ensemble(
+            prd,
+            weight,
+            learning_rate,
+            K,
+            theta_0,
+            batch_size,
+            comm_round,
+            lr_dec,
+            lr_staged,
+            grad_track,
+            comm_type=comm_type,
+            exact_diff=exact_diff,
+            comm_every_epoch=comm_every_epoch,
+            path_every=path_every,
+            seeds=seeds,
+            round_counts=round_counts,
+            compression=compression,
+            random_reshuffling=True,
+        )
+
     theta_copy = cp.deepcopy(theta_0)
     theta = [theta_copy]
     if lr_staged:
@@ -212,8 +316,26 @@ def D_RR(
     start = time.time()
     track_time = start
 
+    if comm_type == "choco" and compression is None:
+        raise ValueError("comm_type choco needs compression settings (compression.Choco)")
+    if comm_type == "adaptive" and comm_every_epoch:
+        raise ValueError("comm_type adaptive controls the gossip between steps, set comm_every_epoch=False")
+    # rounds applied to the parameters
+    if comm_type == "choco":
+        gossip = compression.gossip(weight)
+    elif comm_type == "event":
+        gossip = (event or Event_trigger()).gossip(weight)
+    elif comm_type == "all_avg":
+        gossip = Ring_all_reduce(prd.n)
+    else:
+        gossip = Gossip(weight)
+    # rounds applied to the gradient tracker
+    track_gossip = Ring_all_reduce(prd.n) if comm_type == "all_avg" else Gossip(weight)
+    if comm_type == "adaptive":
+        control = (adaptive or Consensus_control()).controller(comm_round)
+    temp = theta_copy
     for k in range(K):
-        temp = theta[-1]
+        gossip.start_epoch(k)
         if grad_track or exact_diff:
             grad_track_y = np.zeros(theta_0.shape)
             grad_prev = np.zeros(theta_0.shape)
@@ -259,7 +381,7 @@ def D_RR(
                 grad = prd.networkgrad(temp, permute=permutes, permute_flag=True)
 
                 if grad_track:
-                    grad_track_y = np.matmul(weight, grad_track_y + grad - grad_prev)
+                    grad_track_y = track_gossip(grad_track_y + grad - grad_prev)
                     grad_prev = cp.deepcopy(grad)
                     temp = temp - learning_rate * grad_track_y
                 elif exact_diff:
@@ -280,15 +402,13 @@ def D_RR(
                     temp = temp - learning_rate * grad
 
                 if not comm_every_epoch:
-                    if comm_round > 0:
+                    if comm_type == "adaptive":
+                        temp = control(temp, grad, learning_rate, gossip)
+                    elif comm_round > 0:
                         if (round + 1) % comm_round == 0:
                             # averaging from neighbours
-                            if comm_type == "graph_avg":
-                                temp = np.matmul(weight, temp)
-                            elif comm_type == "all_avg":
-                                theta_avg = np.sum(temp, axis=0) / node_num
-                                temp = np.array([theta_avg for i in range(node_num)])
-                                raise NotImplementedError
+                            if comm_type in ("graph_avg", "choco", "event", "all_avg"):
+                                temp = gossip(temp)
                             elif comm_type == "no_comm":
                                 pass
                             elif comm_type == "one_shot":
@@ -297,13 +417,13 @@ def D_RR(
                                     and round == update_round - 1
                                     and node == node_num - 1
                                 ):
-                                    temp = np.matmul(weight, temp)
+                                    temp = gossip(temp)
                                     print("One Shot Communication")
                             else:
                                 raise NotImplementedError
                     elif comm_round < 0:
                         for i in range(-comm_round):
-                            temp = np.matmul(weight, temp)
+                            temp = gossip(temp)
                     else:
                         raise ValueError
 
@@ -315,16 +435,18 @@ def D_RR(
             
         if comm_every_epoch:
             if comm_round > 0:
-                if comm_type == "graph_avg":
-                    temp = np.matmul(weight, temp)
+                if comm_type in ("graph_avg", "choco", "event", "all_avg"):
+                    temp = gossip(temp)
                 else:
                     raise ValueError
             elif comm_round < 0:
                 for i in range(-comm_round):
-                    temp = np.matmul(weight, temp)
+                    temp = gossip(temp)
 
+        record_rounds(round_counts, gossip, track_gossip)
         ut.monitor("D_RR", k, K, track_time)
-        theta.append(cp.deepcopy(temp))
+        if (k + 1) % path_every == 0 or k + 1 == K:
+            theta.append(cp.deepcopy(temp))
 
         if save_every != -1 and ((k + 1) % save_every == 0 or k + 1 == K):
             # save_state(theta, save_path, exp_name)
@@ -342,75 +464,264 @@ def D_RR(
     return theta
 
 
+def D_ensemble(
+    prd,
+    weight,
+    learning_rate,
+    K,
+    theta_0,
+    batch_size,
+    comm_round,
+    lr_dec,
+    lr_staged,
+    grad_track,
+    comm_type="graph_avg",
+    exact_diff=False,
+    comm_every_epoch=False,
+    path_every=1,
+    seeds=None,
+    random_reshuffling=True,
+    round_counts=None,
+    compression=None,
+):
+    """
+    Ensemble version of D_SGD / D_RR: E configurations (learning rates,
+    seeds, topologies) stacked along a leading axis advance together, so one
+    loop iteration does E updates with batched products.
+
+    @param
+    :prd                logistic model object, must provide ensemblegrad
+    :weight             (n, n) shared or (E, n, n) per-member weight matrices, or a shared
+                        schedule.Gossip_schedule
+    :learning_rate      scalar or (E, ) per-member learning rates
+    :K                  number of epochs
+    :theta_0            (E, n, p) initial parameters of every member
+    :batch_size         batch size of mini-batch D_SGD / D_RR
+    :comm_round         gradient info communication perioid
+    :seeds              E seeds for the per-member sample streams (drawn from np.random if None)
+    :random_reshuffling D_RR sampling if True, D_SGD sampling otherwise
+    :round_counts       dict filled with the gossip rounds and what was sent per epoch, as in D_RR
+    :compression        compression.Choco settings of comm_type "choco", as in D_RR
+
+    Staged learning rates, stop_at_converge and the intermediate plots of
+    save_every are not supported in ensemble mode. If prd.shared_samples is
+    set (e.g. Problems.multi_pair.LR_pairs) all members draw the same
+    mini-batches from the first seed's stream and ensemblegrad receives
+    (n, bz) sample indices.
+
+    @return
+    :theta              list of (E, n, p) parameters along the training
+    """
+    if lr_staged:
+        raise ValueError("staged learning rates are not supported in ensemble mode")
+
+    ensemble_size = theta_0.shape[0]
+    node_num = prd.n
+    local_num = int(prd.data_distr[0])
+    if np.any(np.asarray(prd.data_distr) != local_num):
+        raise ValueError("ensembles need equally sized local data sets on every node")
+    update_round = math.ceil(local_num / batch_size)
+    if seeds is None:
+        seeds = np.random.randint(0, 2**31 - 1, size=ensemble_size)
+    rngs = [np.random.default_rng(seed) for seed in seeds]
+    shared = getattr(prd, "shared_samples", False)  ## one sample stream for all members
+    if shared:
+        rngs = rngs[:1]
+    lr = np.ones(ensemble_size) * learning_rate
+    lr = lr[:, np.newaxis, np.newaxis]
+    name = "D_RR ensemble" if random_reshuffling else "D_SGD ensemble"
+
+    theta_copy = cp.deepcopy(theta_0)
+    theta = [theta_copy]
+    start = time.time()
+    track_time = start
+
+    grad_track_y = np.zeros(theta_0.shape)
+    grad_prev = np.zeros(theta_0.shape)
+
+    if comm_type == "choco" and compression is None:
+        raise ValueError("comm_type choco needs compression settings (compression.Choco)")
+    if comm_type in ("adaptive", "event"):
+        raise NotImplementedError(f"comm_type {comm_type} controls one run at a time, run the members separately")
+    # rounds applied to the parameters and the gradient tracker
+    if comm_type == "all_avg":
+        gossip, track_gossip = Ring_all_reduce(prd.n), Ring_all_reduce(prd.n)
+    else:
+        gossip = compression.gossip(weight) if comm_type == "choco" else Gossip(weight)
+        track_gossip = Gossip(weight)
+    temp = theta_copy
+    for k in range(K):
+        gossip.start_epoch(k)
+        if random_reshuffling and (grad_track or exact_diff):
+            grad_track_y = np.zeros(theta_0.shape)
+            grad_prev = np.zeros(theta_0.shape)
+        if exact_diff:
+            theta_prev = cp.deepcopy(temp)
+
+        if lr_dec:
+            lr = np.full(lr.shape, 1 / (50 * k + 400))
+
+        for node in range(node_num):
+            if random_reshuffling:
+                sample_vec = np.array(
+                    [[rng.permutation(local_num) for i in range(node_num)] for rng in rngs]
+                )  # (E, n, local_num), E = 1 if shared
+            for round in range(update_round):
+                if random_reshuffling:
+                    permutes = sample_vec[:, :, round * batch_size : (round + 1) * batch_size]
+                else:
+                    permutes = np.array(
+                        [
+                            [rng.permutation(local_num)[:batch_size] for i in range(node_num)]
+                            for rng in rngs
+                        ]
+                    )
+                if shared:
+                    permutes = permutes[0]
+
+                grad = prd.ensemblegrad(temp, permutes)
+
+                if grad_track:
+                    grad_track_y = track_gossip(grad_track_y + grad - grad_prev)
+                    grad_prev = grad
+                    temp = temp - lr * grad_track_y
+                elif exact_diff:
+                    if round == 0:
+                        temp = temp - lr * grad
+                    else:
+                        temp = 2 * temp - theta_prev - lr * (grad - grad_prev)
+                    if np.any(np.isnan(temp)):
+                        print(f"nan at {k} round")
+                        raise ValueError
+
+                    theta_prev = temp
+                    grad_prev = grad
+                else:
+                    temp = temp - lr * grad
+
+                if not comm_every_epoch:
+                    if comm_round > 0:
+                        if (round + 1) % comm_round == 0:
+                            if comm_type in ("graph_avg", "choco", "all_avg"):
+                                temp = gossip(temp)
+                            elif comm_type == "no_comm":
+                                pass
+                            elif comm_type == "one_shot":
+                                if (
+                                    k == K - 1
+                                    and round == update_round - 1
+                                    and node == node_num - 1
+                                ):
+                                    temp = gossip(temp)
+                                    print("One Shot Communication")
+                            else:
+                                raise NotImplementedError
+                    elif comm_round < 0:
+                        for i in range(-comm_round):
+                            temp = gossip(temp)
+                    else:
+                        raise ValueError
+
+        if comm_every_epoch:
+            if comm_round > 0:
+                if comm_type in ("graph_avg", "choco", "all_avg"):
+                    temp = gossip(temp)
+                else:
+                    raise ValueError
+            elif comm_round < 0:
+                for i in range(-comm_round):
+                    temp = gossip(temp)
+
+        record_rounds(round_counts, gossip, track_gossip)
+        ut.monitor(name, k, K, track_time)
+        if (k + 1) % path_every == 0 or k + 1 == K:
+            theta.append(cp.deepcopy(temp))
+
+    print(f"{ensemble_size} Members | {update_round}# Updates | {batch_size} Batch Size")
+    print(f"Time Span: {time.time() - start}")
+    return theta
+
+
 def DPG_RR():
     # DRR with different communication frequency
     pass
 
 
-def SADDOPT(prd, B1, B2, learning_rate, K, theta_0):
+def SADDOPT(prd, B1, B2, learning_rate, K, theta_0, round_counts=None):
+    # round_counts: filled every epoch as in D_RR (schedule.record_rounds)
     theta = cp.deepcopy(theta_0)
     theta_epoch = [cp.deepcopy(theta)]
     sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
     grad = prd.networkgrad(theta, sample_vec)
     tracker = cp.deepcopy(grad)
     Y = np.ones(B1.shape[1])
+    gossip, track_gossip = Gossip(B1), Gossip(B2)
     for k in range(K):
-        theta = np.matmul(B1, theta) - learning_rate * tracker
+        theta, Y = gossip.push_sum(theta, Y)
+        theta = theta - learning_rate * tracker
         grad_last = cp.deepcopy(grad)
-        Y = np.matmul(B1, Y)
         YY = np.diag(Y)
         z = np.matmul(LA.inv(YY), theta)
         sample_vec = np.array(
             [np.random.choice(prd.data_distr[i]) for i in range(prd.n)]
         )
         grad = prd.networkgrad(z, sample_vec)
-        tracker = np.matmul(B2, tracker) + grad - grad_last
+        tracker = track_gossip(tracker) + grad - grad_last
         ut.monitor("SADDOPT", k, K)
         if (k + 1) % prd.b == 0:
             theta_epoch.append(cp.deepcopy(theta))
+            record_rounds(round_counts, gossip, track_gossip)
     return theta_epoch
 
 
-def GP(prd, B, learning_rate, K, theta_0):
+def GP(prd, B, learning_rate, K, theta_0, round_counts=None):
+    # round_counts: filled every iteration as in D_RR (schedule.record_rounds)
     theta = [cp.deepcopy(theta_0)]
     grad = prd.networkgrad(theta[-1])
     Y = np.ones(B.shape[1])
+    gossip = Gossip(B)
     for k in range(K):
-        theta.append(np.matmul(B, theta[-1]) - learning_rate * grad)
-        Y = np.matmul(B, Y)
+        mixed, Y = gossip.push_sum(theta[-1], Y)
+        theta.append(mixed - learning_rate * grad)
         YY = np.diag(Y)
         z = np.matmul(LA.inv(YY), theta[-1])
         grad = prd.networkgrad(z)
+        record_rounds(round_counts, gossip)
         ut.monitor("GP", k, K)
     return theta
 
 
-def ADDOPT(prd, B1, B2, learning_rate, K, theta_0):
+def ADDOPT(prd, B1, B2, learning_rate, K, theta_0, round_counts=None):
+    # round_counts: filled every iteration as in D_RR (schedule.record_rounds)
     theta = [cp.deepcopy(theta_0)]
     grad = prd.networkgrad(theta[-1])
     tracker = cp.deepcopy(grad)
     Y = np.ones(B1.shape[1])
+    gossip, track_gossip = Gossip(B1), Gossip(B2)
     for k in range(K):
-        theta.append(np.matmul(B1, theta[-1]) - learning_rate * tracker)
+        mixed, Y = gossip.push_sum(theta[-1], Y)
+        theta.append(mixed - learning_rate * tracker)
         grad_last = cp.deepcopy(grad)
-        Y = np.matmul(B1, Y)
         YY = np.diag(Y)
         z = np.matmul(LA.inv(YY), theta[-1])
         grad = prd.networkgrad(z)
-        tracker = np.matmul(B2, tracker) + grad - grad_last
+        tracker = track_gossip(tracker) + grad - grad_last
+        record_rounds(round_counts, gossip, track_gossip)
         ut.monitor("ADDOPT", k, K)
     return theta
 
 
-def SGP(prd, B, learning_rate, K, theta_0):
+def SGP(prd, B, learning_rate, K, theta_0, round_counts=None):
+    # round_counts: filled every epoch as in D_RR (schedule.record_rounds)
     theta = cp.deepcopy(theta_0)
     theta_epoch = [cp.deepcopy(theta)]
     sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
     grad = prd.networkgrad(theta, sample_vec)
     Y = np.ones(B.shape[1])
+    gossip = Gossip(B)
     for k in range(K):
-        theta = np.matmul(B, theta) - learning_rate * grad
-        Y = np.matmul(B, Y)
+        theta, Y = gossip.push_sum(theta, Y)
+        theta = theta - learning_rate * grad
         YY = np.diag(Y)
         z = np.matmul(LA.inv(YY), theta)
         sample_vec = np.array(
@@ -420,4 +731,5 @@ def SGP(prd, B, learning_rate, K, theta_0):
         ut.monitor("SGP", k, K)
         if (k + 1) % prd.b == 0:
             theta_epoch.append(cp.deepcopy(theta))
+            record_rounds(round_counts, gossip)
     return theta_epoch
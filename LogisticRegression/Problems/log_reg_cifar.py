@@ -51,7 +51,8 @@ class LR_L4( object ):
         self.reg = 0.2
         print( 'reg', self.reg )
 
-    def load_data(self):
+    @staticmethod
+    def load_raw():                   ## whole normalized data set, labels 0-9
 #         (trainX, trainY), (testX, testY) = cifar10.load_data()         # use this if you want have keras installed
         # use this otherwise
         cifar10.maybe_download_and_extract()                             # using this to download cifar-10 dataset without keras. 
@@ -73,6 +74,10 @@ class LR_L4( object ):
         ## data normalization: each data is normalized as a unit vector 
         trainX = trainX / LA.norm(trainX,axis = 1)[:,None]
         testX = testX / LA.norm(testX,axis = 1)[:,None]
+        return trainX, trainY, testX, testY
+
+    def load_data(self):
+        trainX, trainY, testX, testY = self.load_raw()
         
         ## select corresponding classes
         trainX_C1_C2 = trainX[ (trainY == self.class1) | (trainY == self.class2) ]
@@ -199,6 +204,38 @@ class LR_L4( object ):
                 grad[i] = self.localgrad(theta, i, idxv[i])
             return grad
     
+    def ensemblegrad(self, theta, permute):  ## network mini-batch gradient of an ensemble of models
+        """
+            Network mini-batch gradient for E independent models advanced
+            together (see DOPTIMIZER.D_RR with a 3-D theta_0). All members and
+            nodes are handled by two batched products instead of E * n calls
+            to localgrad.
+
+            @param
+            :theta          (E, n, p) parameters, member e / node i in theta[e, i]
+            :permute        (E, n, bz) local sample indices of every member and node
+
+            @return
+            :grad           (E, n, p) gradient of every member at each node
+        """
+        assert self.balanced == True, 'ensemble gradients need equally sized local data sets'
+        permute = np.asarray(permute)
+        nodes = np.arange(self.n)[np.newaxis, :, np.newaxis]
+        X_b = self.X[nodes, permute]                                        ## (E, n, bz, p)
+        Y_b = self.Y[nodes, permute]                                        ## (E, n, bz)
+        temp1 = np.exp( np.einsum('enbp,enp->enb', X_b, theta) * (-Y_b) )
+        temp2 = ( temp1/(temp1+1) ) * (-Y_b)
+        grad = np.einsum('enb,enbp->enp', temp2, X_b)
+
+        if self.nonconvex:
+            denominator = np.power(theta,2)
+            denominator = np.power(denominator + 1, 2)
+            grad_reg = 2*theta / denominator
+        else:
+            grad_reg = 2*theta
+
+        return grad / permute.shape[-1] + self.reg/2 * grad_reg
+        
     def grad(self, theta, idx = None, permute = None, permute_flag = None): ## centralized stochastic/batch gradient
         if permute_flag:
             # Both SGD & RR is implemented here
@@ -45,7 +45,8 @@ class LR_L2( object ):
         self.b = int(self.N/self.n)           ## average local samples
         print(f"L-smooth constant {self.L}")
 
-    def load_data(self):
+    @staticmethod
+    def load_raw():                   ## whole normalized data set, labels 0-9
         if os.path.exists('mnist.npz'):
             print( 'data exists' )
             data = np.load('mnist.npz', allow_pickle=True)
@@ -64,6 +65,10 @@ class LR_L2( object ):
         
         ## data normalization: each data is normalized as a unit vector 
         X = X / LA.norm(X,axis = 1)[:,None]
+        return X, y
+
+    def load_data(self):
+        X, y = self.load_raw()
         
         ## select corresponding classes
         X_C1_C2 = X[ (y == self.class1) | (y == self.class2) ]
@@ -185,6 +190,30 @@ class LR_L2( object ):
                 grad[i] = self.localgrad(theta, i, idxv[i])
             return grad
     
+    def ensemblegrad(self, theta, permute):  ## network mini-batch gradient of an ensemble of models
+        """
+            Network mini-batch gradient for E independent models advanced
+            together (see DOPTIMIZER.D_RR with a 3-D theta_0). All members and
+            nodes are handled by two batched products instead of E * n calls
+            to localgrad.
+
+            @param
+            :theta          (E, n, p) parameters, member e / node i in theta[e, i]
+            :permute        (E, n, bz) local sample indices of every member and node
+
+            @return
+            :grad           (E, n, p) gradient of every member at each node
+        """
+        assert self.balanced == True, 'ensemble gradients need equally sized local data sets'
+        permute = np.asarray(permute)
+        nodes = np.arange(self.n)[np.newaxis, :, np.newaxis]
+        X_b = self.X[nodes, permute]                                        ## (E, n, bz, p)
+        Y_b = self.Y[nodes, permute]                                        ## (E, n, bz)
+        temp1 = np.exp( np.einsum('enbp,enp->enb', X_b, theta) * (-Y_b) )
+        temp2 = ( temp1/(temp1+1) ) * (-Y_b)
+        grad = np.einsum('enb,enbp->enp', temp2, X_b)
+        return grad / permute.shape[-1] + self.reg * theta
+    
     def grad(self, theta, idx = None, permute = None, permute_flag = None): ## centralized stochastic/batch gradient
         """ 
             Gradient Computation for CSGD and CRR. Note that in our experiment, 
@@ -0,0 +1,177 @@
+########################################################################################################################
+####---------------------------------Multi-pair one-vs-one Logistic Regression--------------------------------------####
+########################################################################################################################
+
+## Used to train several one-vs-one class pairs of MNIST / CIFAR-10 in one decentralized run: the pairs are stacked as
+## the ensemble dimension of DOPTIMIZER.D_RR / D_SGD (see D_ensemble) and share every mini-batch.
+
+import numpy as np
+from numpy import linalg as LA
+import itertools
+from Problems.logistic_regression import LR_L2
+from Problems.log_reg_cifar import LR_L4
+
+
+class LR_pairs( object ):
+    def __init__(self, n_agent, pairs = None, dataset = "cifar10", train = 60000, nonconvex = False, theta_opt = None ):
+        """
+            @param
+            :n_agent        number of nodes
+            :pairs          list of (class1, class2), class1 is labeled +1 and class2 -1 as in LR_L2 / LR_L4.
+                            All 45 pairs if None
+            :dataset        "cifar10" (LR_L4 data) or "mnist" (LR_L2 data)
+            :train          MNIST only, number of leading samples used for training (standard split)
+            :theta_opt      (p, ) or (E, p) reference optimum of the pairs used by the gap files (solve_pair of every
+                            pair if None)
+
+            Only the classes appearing in some pair are kept, and the data is loaded once for all pairs. Node i holds
+            the same local samples for every pair, so a mini-batch of node i serves every pair whose classes appear in
+            it. An epoch is one pass over the local data of the union of classes, i.e. one pass over each pair's data.
+            A mini-batch of bz samples holds about 2 bz / len(classes) samples of a pair, so the gap files of multi-pair
+            runs are named with bz{bz}shared{len(classes)} (see Algos.batch_label).
+        """
+        if pairs is None:
+            pairs = list(itertools.combinations(range(10), 2))
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.E = len(self.pairs)                ## number of pairs (ensemble size)
+        self.classes = np.unique(self.pairs)
+        self.dataset = dataset
+        self.train = train
+        self.n = n_agent
+        self.balanced = True
+        self.limited_labels = False
+        self.nonconvex = nonconvex
+        self.shared_samples = True              ## D_ensemble draws one mini-batch for all pairs
+        print( 'pairs: ', self.pairs )
+
+        self.X_train, self.C_train, self.X_test, self.C_test = self.load_data()
+        self.N = len(self.X_train)              ## total number of data samples of the kept classes
+        self.X, self.C, self.Y, self.data_distr = self.distribute_data()
+        self.p = len(self.X_train[0])           ## dimension of the feature
+        self.dim = self.p
+        self.reg = 0.2 if dataset == "cifar10" else 0.2 / 2       ## same as LR_L4 / LR_L2
+        self.L, self.kappa = self.smooth_scvx_parameters()
+        self.b = int(self.N/self.n)             ## local samples
+        if theta_opt is None:
+            theta_opt = np.array([ self.solve_pair(e) for e in range(self.E) ])
+        self.theta_opt = np.broadcast_to(theta_opt, (self.E, self.p))
+        print( 'data size', self.N, 'reg', self.reg )
+
+    def load_data(self):
+        if self.dataset == "cifar10":
+            trainX, trainY, testX, testY = LR_L4.load_raw()
+        elif self.dataset == "mnist":
+            X, y = LR_L2.load_raw()
+            trainX, trainY, testX, testY = X[ : self.train], y[ : self.train], X[ self.train : ], y[ self.train : ]
+        else:
+            raise ValueError(f"unknown dataset {self.dataset}")
+
+        ## keep the classes of the pairs, labels stay 0-9
+        train_mask = np.isin(trainY, self.classes)
+        test_mask = np.isin(testY, self.classes)
+        X_train, C_train = trainX[train_mask], trainY[train_mask].astype(int)
+        X_test, C_test = testX[test_mask], testY[test_mask].astype(int)
+
+        ## drop the remainder so that every node holds the same number of samples
+        N = len(X_train) - len(X_train) % self.n
+        return X_train[ : N].copy(), C_train[ : N].copy(), X_test.copy(), C_test.copy()
+
+    def distribute_data(self):
+        X = np.array( np.split( self.X_train, self.n, axis = 0 ) )
+        C = np.array( np.split( self.C_train, self.n, axis = 0 ) )
+        Y = np.array([ self.pair_labels(C, pair) for pair in self.pairs ])  ## (E, n, b), 0 outside the pair
+        data_distribution = np.array([ len(_) for _ in X ])
+        return X, C, Y, data_distribution
+
+    @staticmethod
+    def pair_labels(C, pair):         ## +1 for class1, -1 for class2, 0 for the other classes
+        return np.where(C == pair[0], 1.0, 0.0) - np.where(C == pair[1], 1.0, 0.0)
+
+    def smooth_scvx_parameters(self): ## of the union of the pairs' data
+        Q = np.matmul(self.X_train.T,self.X_train)/self.N
+        L_F = max(LA.eigvalsh(Q))/4
+        L = L_F + self.reg
+        kappa = L/self.reg
+        return L, kappa
+
+    def pair_name(self, e):
+        return f"pair{self.pairs[e][0]}v{self.pairs[e][1]}"
+
+    def pair_view(self, e):
+        """
+            Binary problem of pair e as an LR_L4 object (its objective and gradients are not CIFAR specific), so that
+            analysis.error / test_error and the gap files treat the pair like a single-pair run. Views copy the pair's
+            samples, build them one at a time.
+        """
+        class1, class2 = self.pairs[e]
+        view = LR_L4.__new__(LR_L4)
+        view.class1, view.class2 = class1, class2
+        view.n = self.n
+        view.balanced = True
+        view.limited_labels = False
+        view.nonconvex = self.nonconvex
+
+        train_mask = (self.C_train == class1) | (self.C_train == class2)
+        test_mask = (self.C_test == class1) | (self.C_test == class2)
+        view.X_train = self.X_train[train_mask]
+        view.Y_train = self.pair_labels(self.C_train[train_mask], self.pairs[e]).astype(int)
+        view.X_test = self.X_test[test_mask]
+        view.Y_test = self.pair_labels(self.C_test[test_mask], self.pairs[e]).astype(int)
+        view.N = len(view.X_train)
+
+        ## local data of the pair at every node (sizes differ between nodes)
+        view.X = [ self.X[i][self.Y[e, i] != 0] for i in range(self.n) ]
+        view.Y = [ self.Y[e, i][self.Y[e, i] != 0].astype(int) for i in range(self.n) ]
+        view.data_distr = np.array([ len(_) for _ in view.X ])
+
+        view.p = view.dim = self.p
+        view.reg = self.reg
+        view.L, view.kappa = self.L, self.kappa
+        view.b = int(view.N/self.n)
+        view.node_ordering = getattr(self, "node_ordering", None)
+        return view
+
+    def solve_pair(self, e, tolerance = 1e-8, max_iterations = int(1e5)):
+        """
+            Optimum of pair e (a stationary point if nonconvex) by full gradient descent with step 1 / L of the pair.
+        """
+        view = self.pair_view(e)
+        L, _ = view.smooth_scvx_parameters()
+        theta = np.zeros(self.p)
+        for _ in range(max_iterations):
+            grad = view.F_grad(theta)
+            if LA.norm(grad) < tolerance:
+                break
+            theta = theta - grad / L
+        return theta
+
+    def ensemblegrad(self, theta, permute):  ## network mini-batch gradient of all pairs
+        """
+            Network mini-batch gradient of every pair on a shared mini-batch. The mini-batch is gathered once and one
+            margin product per node serves all pairs; samples of other classes carry label 0 and drop out. Each pair's
+            gradient is averaged over its own samples in the batch, and is zero when the batch has none.
+
+            @param
+            :theta          (E, n, p) parameters, pair e / node i in theta[e, i]
+            :permute        (n, bz) local sample indices of every node, shared by all pairs
+
+            @return
+            :grad           (E, n, p) gradient of every pair at each node
+        """
+        permute = np.asarray(permute)
+        nodes = np.arange(self.n)[:, np.newaxis]
+        X_b = self.X[nodes, permute]                                        ## (n, bz, p)
+        Y_b = self.Y[:, nodes, permute]                                     ## (E, n, bz)
+        temp1 = np.exp( np.einsum('nbp,enp->enb', X_b, theta) * (-Y_b) )
+        temp2 = ( temp1/(temp1+1) ) * (-Y_b)
+        grad = np.einsum('enb,nbp->enp', temp2, X_b)
+
+        if self.nonconvex:
+            denominator = np.power(theta,2)
+            denominator = np.power(denominator + 1, 2)
+            grad_reg = 2*theta / denominator
+        else:
+            grad_reg = 2*theta
+
+        count = np.sum( np.abs(Y_b), axis = -1 )[:, :, np.newaxis]         ## (E, n, 1) pair samples in the batch
+        return ( grad / np.maximum(count, 1) + self.reg/2 * grad_reg ) * (count > 0)
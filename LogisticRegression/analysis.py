@@ -77,3 +77,76 @@ class error:
 
 
 
+
+
+class test_error:
+    def __init__(self, problem, chunk_size = 256):
+        self.pr = problem                                       ## problem class
+        self.X = self.pr.X_test                                 ## held-out feature vectors
+        self.Y = self.pr.Y_test                                 ## held-out label vector
+        self.N = len(self.Y)                                    ## total number of test samples
+        self.reg = self.pr.reg
+        self.nonconvex = getattr(self.pr, "nonconvex", False)   ## LR_L2 has no nonconvex variant
+        self.chunk_size = chunk_size                            ## max number of models per margin product
+
+    def point_loss_error(self, models):
+        """
+            Test loss and test classification error of a stack of models,
+            computed from a single margin product.
+
+            @param
+            :models         (m, p) array, each row is one model
+
+            @return
+            :loss           (m, ) regularized test loss of each model
+            :cls_error      (m, ) fraction of misclassified test samples
+        """
+        models = np.atleast_2d( models )
+        margins = np.matmul( models, self.X.T ) * self.Y        ## (m, N_test)
+        loss = np.sum( np.logaddexp( 0, -margins ), axis = -1 ) / self.N
+        if self.nonconvex:
+            theta_power = np.power( models, 2 )
+            reg_val = (self.reg/2) * np.sum( theta_power / (1 + theta_power), axis = -1 )
+        else:
+            reg_val = (self.reg/2) * ( LA.norm( models, axis = -1 ) ** 2 )
+        cls_error = np.sum( margins < 0, axis = -1 ) / self.N
+        return loss + reg_val, cls_error
+
+    def loss_error_path(self, iterates, per_node = False):
+        """
+            Evaluate a training path on the test set. The consensus model
+            (and optionally every node model) of each epoch is evaluated in
+            one batched margin product; epochs are streamed in chunks so the
+            temporaries stay bounded for long trajectories.
+
+            @param
+            :iterates       (K, p) centralized or (K, n, p) decentralized path
+            :per_node       whether to also evaluate every node's local model
+
+            @return
+            :loss           (K, ) consensus test loss, (K, n+1) with per_node
+                            where column 0 is the consensus model
+            :cls_error      same layout as loss
+        """
+        iterates = np.asarray( iterates )
+        if iterates.ndim == 2:
+            iterates = iterates[:,np.newaxis,:]
+        avg_iterates = np.mean( iterates, axis = 1 )[:,np.newaxis,:]
+        if per_node:
+            models = np.concatenate( (avg_iterates, iterates), axis = 1 )
+        else:
+            models = avg_iterates
+
+        K, m, p = models.shape
+        loss = np.zeros( (K, m) )
+        cls_error = np.zeros( (K, m) )
+        step = max( 1, self.chunk_size // m )
+        for start in range(0, K, step):
+            block = models[start : start + step].reshape(-1, p)
+            block_loss, block_error = self.point_loss_error( block )
+            loss[start : start + step] = block_loss.reshape(-1, m)
+            cls_error[start : start + step] = block_error.reshape(-1, m)
+
+        if per_node:
+            return loss, cls_error
+        return loss[:,0], cls_error[:,0]
@@ -0,0 +1,177 @@
+########################################################################################################################
+####-----------------------------------------------Topology Catalog-------------------------------------------------####
+########################################################################################################################
+
+## Used to generate random topologies once, in parallel, and look them up by their spectral properties afterwards
+
+import os
+import json
+import multiprocessing as mp
+import numpy as np
+from graph import Weight_matrix, Geometric_graph, Erdos_Renyi_graph
+from utilities import convert_to_doubly_stochastic, COMM_CACHE_VERSION, SINKHORN_MAX_ITERATIONS, SINKHORN_TOLERANCE
+from spectral import second_singular_values
+
+
+def _generate(task):
+    """
+    One chunk of candidates: random graphs -> row stochastic -> Sinkhorn
+    (batched) -> lambda. Runs in a worker process.
+    """
+    graph, node_num, count, params, seed = task
+    rng = np.random.default_rng(seed)
+    if graph == "geometric":
+        adjacency = [
+            Geometric_graph(node_num, rng).undirected(params["radius"]) for _ in range(count)
+        ]
+    elif graph == "erdos_renyi":
+        adjacency = [
+            Erdos_Renyi_graph(node_num, params["epsilon"], rng).undirected() for _ in range(count)
+        ]
+    else:
+        raise ValueError("graph must be geometric or erdos_renyi")
+
+    matrices = np.array([Weight_matrix(adj).row_stochastic() for adj in adjacency])
+    matrices = convert_to_doubly_stochastic(matrices, params["max_iterations"], params["tolerance"])
+    return node_num, matrices, second_singular_values(matrices)
+
+
+class Topology_catalog:
+    """
+    On-disk catalog of random communication matrices sorted by lambda
+    (spectral.second_singular_value). For every node count the matrices are
+    stored as one (count, n, n) .npy stack next to their sorted lambdas, and
+    index.json in root records what has been generated. Queries are binary
+    searches over the sorted lambdas. The entry name holds everything that
+    determines the matrices, as the key of utilities.comm_cache_key does:
+    the graph, its parameters, the Sinkhorn settings, the seed and the
+    cache version.
+
+    @param
+    :root           directory of the catalog
+    :graph          "geometric" (param radius) or "erdos_renyi" (param epsilon)
+    :seed           seed of the generated graphs
+    :params         generator parameters, and max_iterations / tolerance of the Sinkhorn scaling (those of
+                    utilities.init_comm_matrix by default)
+    """
+
+    def __init__(self, root, graph="geometric", seed=0, **params):
+        self.root = root
+        self.graph = graph
+        self.seed = seed
+        self.params = dict(dict(max_iterations=SINKHORN_MAX_ITERATIONS, tolerance=SINKHORN_TOLERANCE), **params)
+        self.name = "_".join(
+            [graph]
+            + [f"{key}{value}" for key, value in sorted(self.params.items())]
+            + [f"seed{seed}", f"v{COMM_CACHE_VERSION}"]
+        )
+        os.makedirs(root, exist_ok=True)
+        self.index_path = f"{root}/index.json"
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+        self._loaded = {}
+
+    def path(self, node_num):
+        return f"{self.root}/{self.name}_node{node_num}"
+
+    def count(self, node_num):
+        return self.index.get(self.name, {}).get(str(node_num), {}).get("count", 0)
+
+    def build(self, nodes_list, count, workers=None, chunk=1000):
+        """
+        Generate count candidates for every node count not yet in the catalog,
+        in chunks of chunk graphs spread over workers processes. Chunk i of
+        node count n is seeded by (seed, n, i), so a catalog is reproducible
+        independently of the number of workers.
+        """
+        todo = [n for n in nodes_list if self.count(n) < count]
+        if not todo:
+            return
+        tasks = [
+            (self.graph, n, min(chunk, count - start), self.params, np.random.SeedSequence([self.seed, n, i]))
+            for n in todo
+            for i, start in enumerate(range(0, count, chunk))
+        ]
+        results = {n: ([], []) for n in todo}
+        method = "fork" if "fork" in mp.get_all_start_methods() else None
+        with mp.get_context(method).Pool(workers) as pool:
+            for done, (n, matrices, lambdas) in enumerate(pool.imap(_generate, tasks)):
+                results[n][0].append(matrices)
+                results[n][1].append(lambdas)
+                if (done + 1) % max(1, len(tasks) // 10) == 0:
+                    print(f"{(done + 1) / len(tasks) * 100:.0f}% generated", flush=True)
+
+        for n, (matrices, lambdas) in results.items():
+            matrices, lambdas = np.concatenate(matrices), np.concatenate(lambdas)
+            order = np.argsort(lambdas, kind="stable")
+            np.save(f"{self.path(n)}_matrices.npy", matrices[order])
+            np.save(f"{self.path(n)}_lambdas.npy", lambdas[order])
+            self.index.setdefault(self.name, {})[str(n)] = dict(
+                count=count, seed=self.seed, graph=self.graph, params=self.params
+            )
+            self._loaded.pop(n, None)
+        self._save_index()
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def load(self, node_num):
+        """
+        (matrices, lambdas) of a node count, the matrices memory-mapped.
+        """
+        if node_num not in self._loaded:
+            if self.count(node_num) == 0:
+                raise KeyError(f"no {self.name} graphs with {node_num} nodes, build them first")
+            self._loaded[node_num] = (
+                np.load(f"{self.path(node_num)}_matrices.npy", mmap_mode="r"),
+                np.load(f"{self.path(node_num)}_lambdas.npy"),
+            )
+        return self._loaded[node_num]
+
+    def nearest(self, node_num, lambd):
+        """
+        Index of the candidate with lambda closest to lambd.
+        """
+        _, lambdas = self.load(node_num)
+        idx = np.clip(np.searchsorted(lambdas, lambd), 1, len(lambdas) - 1)
+        left, right = lambdas[idx - 1], lambdas[idx]
+        return np.where(np.abs(lambd - left) <= np.abs(right - lambd), idx - 1, idx)
+
+    def query(self, lambd, nodes_list):
+        """
+        For every node count, the (matrix, lambda) with lambda closest to lambd.
+        """
+        result = {}
+        for n in nodes_list:
+            matrices, lambdas = self.load(n)
+            idx = self.nearest(n, lambd)
+            result[n] = (np.array(matrices[idx]), lambdas[idx])
+        return result
+
+    def matched(self, nodes_list, k=1):
+        """
+        The k best matches of lambda across node counts, best first. Every
+        candidate of nodes_list[0] is paired with the nearest lambda of the
+        other node counts; a match is ranked by the spread (max - min) of
+        its lambdas. Each match is a dict n -> (matrix, lambda).
+        """
+        _, anchors = self.load(nodes_list[0])
+        matched_idx = [np.arange(len(anchors))] + [self.nearest(n, anchors) for n in nodes_list[1:]]
+        matched_lambdas = np.array(
+            [self.load(n)[1][idx] for n, idx in zip(nodes_list, matched_idx)]
+        )
+        spread = matched_lambdas.max(axis=0) - matched_lambdas.min(axis=0)
+        best = np.argsort(spread, kind="stable")[:k]
+        return [
+            {
+                n: (np.array(self.load(n)[0][idx[b]]), self.load(n)[1][idx[b]])
+                for n, idx in zip(nodes_list, matched_idx)
+            }
+            for b in best
+        ]
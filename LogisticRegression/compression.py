@@ -0,0 +1,230 @@
+########################################################################################################################
+####-------------------------------------------------Compression----------------------------------------------------####
+########################################################################################################################
+
+## Used to gossip compressed parameters: every node sends Q(x_i - xhat_i) instead of x_i, where the public copies xhat
+## accumulate what was sent (error feedback), and mixes with a consensus step size gamma (Koloskova, Stich & Jaggi,
+## "Decentralized stochastic optimization and gossip algorithms with compressed communication", CHOCO-Gossip).
+## Event-triggered gossip skips the messages of nodes whose parameters barely moved since their last broadcast.
+
+import math
+import time
+import numpy as np
+from scipy import sparse as sp
+from schedule import Gossip, Gossip_schedule
+
+
+class Quantizer:
+    """
+    Unbiased stochastic quantization of every row x to ||x||_inf * sign(x) * l / s
+    with s = 2^(bits - 1) - 1 levels, rounding |x| / ||x||_inf * s up or down at
+    random. A row costs bits per entry and one float64 scale (p + 1 scalars).
+    One bit leaves no level besides 0, so bits must be at least 2.
+    """
+
+    def __init__(self, bits=8):
+        if bits < 2:
+            raise ValueError("Quantizer needs bits >= 2 (one sign bit and at least one level)")
+        self.bits = bits
+        self.levels = 2 ** (bits - 1) - 1
+
+    def compress(self, x, rng):
+        scale = np.max(np.abs(x), axis=-1, keepdims=True)
+        scaled = np.abs(x) / np.where(scale > 0, scale, 1) * self.levels
+        rounded = np.floor(scaled + rng.uniform(size=x.shape))
+        return np.sign(x) * rounded * scale / self.levels, math.ceil(x.shape[-1] * self.bits / 8) + 8
+
+    def scalars(self, p):
+        return p + 1
+
+    def __repr__(self):
+        return f"Quantizer(bits={self.bits})"
+
+
+class Top_k:
+    """
+    The k = ceil(fraction p) entries of largest magnitude of every row, sent
+    as (int32 index, float64 value) pairs.
+    """
+
+    def __init__(self, fraction=0.1):
+        self.fraction = fraction
+
+    def compress(self, x, rng):
+        k = max(1, math.ceil(self.fraction * x.shape[-1]))
+        index = np.argpartition(np.abs(x), -k, axis=-1)[..., -k:]
+        q = np.zeros_like(x)
+        np.put_along_axis(q, index, np.take_along_axis(x, index, axis=-1), axis=-1)
+        return q, k * (4 + 8)
+
+    def scalars(self, p):
+        return max(1, math.ceil(self.fraction * p))
+
+    def __repr__(self):
+        return f"Top_k(fraction={self.fraction})"
+
+
+class Random_k:
+    """
+    k = ceil(fraction p) random entries of every row. The indices come from a
+    seed shared by sender and receivers, so only the float64 values are sent.
+    """
+
+    def __init__(self, fraction=0.1):
+        self.fraction = fraction
+
+    def compress(self, x, rng):
+        p = x.shape[-1]
+        k = max(1, math.ceil(self.fraction * p))
+        index = np.argsort(rng.uniform(size=x.shape), axis=-1)[..., :k]
+        q = np.zeros_like(x)
+        np.put_along_axis(q, index, np.take_along_axis(x, index, axis=-1), axis=-1)
+        return q, k * 8
+
+    def scalars(self, p):
+        return max(1, math.ceil(self.fraction * p))
+
+    def __repr__(self):
+        return f"Random_k(fraction={self.fraction})"
+
+
+class Choco:
+    """
+    Settings of comm_type "choco": a compressor (Quantizer, Top_k or Random_k)
+    and the consensus step size gamma (smaller for stronger compression).
+    """
+
+    def __init__(self, compressor, gamma=0.5, seed=0):
+        self.compressor = compressor
+        self.gamma = gamma
+        self.seed = seed
+
+    def gossip(self, weight):
+        return Choco_gossip(weight, self.compressor, self.gamma, self.seed)
+
+    def __repr__(self):
+        return f"Choco({self.compressor}, gamma={self.gamma})"
+
+
+class Choco_gossip(Gossip):
+    """
+    CHOCO-Gossip rounds of one training run:
+        q = Q(x - xhat),  xhat = xhat + q,  x = x + gamma (W xhat - xhat).
+    Node i sends q_i; every neighbor adds it to its copy of xhat_i, so the
+    copies stay equal to xhat_i without sending it. xhat starts at 0.
+    """
+
+    def __init__(self, weight, compressor, gamma, seed=0):
+        super().__init__(weight)
+        self.compressor = compressor
+        self.gamma = gamma
+        self.rng = np.random.default_rng(seed)
+        self.public = None  # xhat
+
+    def __call__(self, theta):
+        if self.public is None:
+            self.public = np.zeros(np.shape(theta))
+        q, row_bytes = self.compressor.compress(theta - self.public, self.rng)
+        self.public = self.public + q
+        self.count(theta, row_bytes, self.compressor.scalars(np.shape(theta)[-1]))
+        theta = theta + self.gamma * (self.apply(self.public) - self.public)
+        self.t += 1
+        return theta
+
+
+class Event_trigger:
+    """
+    Settings of comm_type "event": node j sends its parameters to neighbor
+    i only when they moved by more than threshold * decay^k (Euclidean
+    norm) since the last message on that edge, in epoch k.
+    """
+
+    def __init__(self, threshold=1e-3, decay=1.0):
+        self.threshold = threshold
+        self.decay = decay
+
+    def gossip(self, weight):
+        return Event_gossip(weight, self.threshold, self.decay)
+
+    def __repr__(self):
+        return f"Event_trigger(threshold={self.threshold}, decay={self.decay})"
+
+
+class Event_gossip(Gossip):
+    """
+    Event-triggered gossip rounds of one training run. Node i keeps the
+    copy b_ij of the last message node j sent it, one per edge, since the
+    neighbors of a schedule change from round to round. In round t every
+    edge j -> i of W(t) with ||x_j - b_ij|| > threshold, or that never
+    carried a message, sets b_ij = x_j and sends it, and every node mixes
+    its own current parameters with its copies:
+        x_i = W_ii x_i + sum_{j != i} W_ij b_ij.
+    For a fixed matrix the copies on the edges out of j stay equal, so j
+    either broadcasts or stays silent. The ledger counts the skipped
+    messages of every node ("skipped").
+    """
+
+    def __init__(self, weight, threshold, decay=1.0):
+        super().__init__(weight)
+        self.initial_threshold = threshold
+        self.decay = decay
+        self.threshold = threshold
+        self.keys = np.zeros(0, dtype=np.int64)  # sorted edge keys i * n + j
+        self.slots = np.zeros(0, dtype=np.int64)  # row of every key in copies
+        self.copies = None  # b, one row per edge seen so far
+        self._edges = None  # edges of a fixed matrix
+
+    def start_epoch(self, k):
+        super().start_epoch(k)
+        self.threshold = self.initial_threshold * self.decay**k
+
+    def edges(self):
+        """
+        Receivers i, senders j and weights W_ij of the off-diagonal nonzeros
+        of round t, and the diagonal.
+        """
+        if self._edges is not None:
+            return self._edges
+        schedule = isinstance(self.weight, Gossip_schedule)
+        matrix = sp.coo_matrix(self.weight.matrix(self.t) if schedule else self.weight)
+        off_diagonal = (matrix.data != 0) & (matrix.row != matrix.col)
+        edges = matrix.row[off_diagonal], matrix.col[off_diagonal], matrix.data[off_diagonal], matrix.diagonal()
+        if not schedule:
+            self._edges = edges
+        return edges
+
+    def edge_slots(self, keys, p):
+        """
+        Rows of copies of the edge keys, adding zero rows for the edges that
+        never carried a message; returns the rows and whether each is new.
+        """
+        position = np.searchsorted(self.keys, keys)
+        new = position == len(self.keys)
+        new[~new] = self.keys[position[~new]] != keys[~new]
+        if np.any(new):
+            start = 0 if self.copies is None else len(self.copies)
+            added = np.zeros((np.count_nonzero(new), p))
+            self.copies = added if self.copies is None else np.vstack([self.copies, added])
+            known = np.concatenate([self.keys, keys[new]])
+            slots = np.concatenate([self.slots, start + np.arange(len(added))])
+            order = np.argsort(known)
+            self.keys, self.slots = known[order], slots[order]
+            position = np.searchsorted(self.keys, keys)
+        return self.slots[position], new
+
+    def __call__(self, theta):
+        theta = np.asarray(theta)
+        n, p = theta.shape
+        receivers, senders, weights, own = self.edges()
+        slots, new = self.edge_slots(receivers.astype(np.int64) * n + senders, p)
+        send = new | (np.linalg.norm(theta[senders] - self.copies[slots], axis=-1) > self.threshold)
+        self.copies[slots[send]] = theta[senders[send]]
+        self.count(theta, p * theta.itemsize, sent=np.bincount(senders[send], minlength=n))
+        self.ledger.setdefault("skipped", np.zeros(n, dtype=np.int64))
+        self.ledger["skipped"] += np.bincount(senders[~send], minlength=n)
+        start = time.perf_counter()
+        neighbors = sp.csr_matrix((weights, (receivers, np.arange(len(slots)))), shape=(n, len(slots)))
+        theta = own[:, np.newaxis] * theta + neighbors @ self.copies[slots]
+        self.mix_time += time.perf_counter() - start
+        self.t += 1
+        return theta
@@ -0,0 +1,261 @@
+########################################################################################################################
+####---------------------------------------------------Dynamic------------------------------------------------------####
+########################################################################################################################
+
+## Used to train on a network whose edges and nodes change during the run. Edge and node insertions / deletions
+## update the weights locally (Metropolis) or by a warm-started Sinkhorn iteration, and the spectral estimate is
+## refreshed by a Lanczos iteration started from the previous eigenvector.
+
+import warnings
+import numpy as np
+from scipy import sparse as sp
+from scipy.sparse import linalg as sla
+import spectral
+from schedule import Gossip_schedule
+from utilities import sinkhorn_scaling
+
+
+class Dynamic_topology(Gossip_schedule):
+    """
+    Mutable undirected graph (every node has a self loop, as in graph.py)
+    with doubly stochastic weights, used by the optimizers like any other
+    schedule. Changes take effect at the next gossip round.
+
+    Metropolis weights w_ij = 1 / (2 max(d_i, d_j)) only depend on the
+    degrees at both ends, so a change at node i rewrites the weights of the
+    edges at i and the diagonal entries of i and its neighbors. Sinkhorn
+    weights diag(r) A diag(c) are rebalanced lazily, once before the next
+    round, starting from the previous scaling vectors.
+
+    Changes during training are given per epoch with at_epoch, or made by
+    hook(topology, epoch), called at the start of every epoch. Nodes that
+    leave keep their row of the parameters with W_ii = 1 until they are
+    connected again (add_node(neighbors, node=i)). The topology at the start
+    of the first run is restored at the start of every later run, so every
+    run of a sweep sees the same sequence of changes.
+
+    @param
+    :adjacency      undirected 0-1 adjacency matrix, dense or sparse (self loops implied)
+    :weighting      "metropolis" or "sinkhorn"
+    :hook           hook(topology, epoch) called at the start of every epoch (picklable for sweep worker processes)
+    :max_iterations, tolerance  of the Sinkhorn iteration and the spectral estimate
+    """
+
+    def __init__(self, adjacency, weighting="metropolis", hook=None, max_iterations=int(1e4), tolerance=1e-7):
+        if weighting not in ("metropolis", "sinkhorn"):
+            raise ValueError("weighting must be metropolis or sinkhorn")
+        super().__init__(adjacency.shape[0], 1)
+        self.weighting = weighting
+        self.hook = hook
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+
+        edges = sp.triu(sp.csr_matrix(adjacency), k=1).tocoo()
+        self.neighbors = [set() for _ in range(self.size)]
+        for i, j in zip(edges.row.tolist(), edges.col.tolist()):
+            self.neighbors[i].add(j)
+            self.neighbors[j].add(i)
+        self.degree = np.array([len(_) + 1 for _ in self.neighbors])
+
+        self.edge_weight = {}  # Metropolis weight of edge (i, j), i < j
+        self.diagonal = np.ones(self.size)
+        self.r, self.c = np.ones(self.size), np.ones(self.size)  # Sinkhorn scaling vectors
+        self.balanced = False
+        if weighting == "metropolis":  # Weight_matrix.metroplis on the edge list
+            i, j = edges.row, edges.col
+            weights = 1 / (2 * np.maximum(self.degree[i], self.degree[j]))
+            self.edge_weight = dict(zip(zip(i.tolist(), j.tolist()), weights.tolist()))
+            self.diagonal = 1 - np.bincount(i, weights=weights, minlength=self.size) - np.bincount(
+                j, weights=weights, minlength=self.size
+            )
+
+        self.events = []  # (epoch, method name, args)
+        self._initial = None
+        self._W = None
+        self._vector = None  # last leading eigenvector, warm start of the spectral estimate
+
+    def add_edge(self, i, j):
+        if i == j or j in self.neighbors[i]:
+            return
+        self.neighbors[i].add(j)
+        self.neighbors[j].add(i)
+        self._changed([i, j])
+
+    def remove_edge(self, i, j):
+        if j not in self.neighbors[i]:
+            return
+        self.neighbors[i].discard(j)
+        self.neighbors[j].discard(i)
+        self.edge_weight.pop((min(i, j), max(i, j)), None)
+        self._changed([i, j])
+
+    def add_node(self, neighbors=(), node=None):
+        """
+        Connect node (an isolated node, e.g. one that left) to neighbors, or
+        append a new node if node is None (outside of training only: the
+        parameters have a fixed number of rows). Returns the node.
+        """
+        if node is None:
+            node = self.size
+            self.size += 1
+            self.neighbors.append(set())
+            self.degree = np.append(self.degree, 1)
+            self.diagonal = np.append(self.diagonal, 1.0)
+            self.r, self.c = np.append(self.r, 1.0), np.append(self.c, 1.0)
+            self._vector = None
+            self._W = None
+        for j in neighbors:
+            self.add_edge(node, j)
+        return node
+
+    def remove_node(self, i):
+        """
+        Disconnect node i from all its neighbors (W_ii = 1 afterwards).
+        """
+        for j in list(self.neighbors[i]):
+            self.remove_edge(i, j)
+
+    def at_epoch(self, epoch, method, *args):
+        """
+        Apply getattr(self, method)(*args) at the start of epoch, e.g.
+        at_epoch(10, "remove_edge", 3, 4).
+        """
+        self.events.append((epoch, method, args))
+
+    def start_epoch(self, k):
+        if k == 0:
+            if self._initial is None:
+                self._initial = self._state()
+            else:
+                self._restore(self._initial)
+        for epoch, method, args in self.events:
+            if epoch == k:
+                getattr(self, method)(*args)
+        if self.hook is not None:
+            self.hook(self, k)
+
+    def _state(self):
+        return (
+            self.size,
+            [set(_) for _ in self.neighbors],
+            self.degree.copy(),
+            dict(self.edge_weight),
+            self.diagonal.copy(),
+            self.r.copy(),
+            self.c.copy(),
+            self.balanced,
+        )
+
+    def _restore(self, state):
+        size, neighbors, degree, edge_weight, diagonal, r, c, balanced = state
+        self.size, self.degree, self.diagonal, self.r, self.c = size, degree.copy(), diagonal.copy(), r.copy(), c.copy()
+        self.neighbors = [set(_) for _ in neighbors]
+        self.edge_weight = dict(edge_weight)
+        self.balanced = balanced
+        self._W = None
+        self._vector = None
+
+    def _changed(self, nodes):
+        self.degree[nodes] = [len(self.neighbors[k]) + 1 for k in nodes]
+        if self.weighting == "metropolis":
+            self._reweight(nodes)
+        else:
+            self.balanced = False
+        self._W = None
+
+    def _reweight(self, nodes):
+        """
+        Metropolis weights of the edges at nodes, and the diagonal entries of
+        nodes and their neighbors.
+        """
+        touched = set(nodes)
+        for i in nodes:
+            for j in self.neighbors[i]:
+                self.edge_weight[(min(i, j), max(i, j))] = 1 / (2 * max(self.degree[i], self.degree[j]))
+                touched.add(j)
+        for k in touched:
+            self.diagonal[k] = 1 - sum(self.edge_weight[(min(k, j), max(k, j))] for j in self.neighbors[k])
+
+    def adjacency(self):
+        """
+        Current 0-1 adjacency matrix with self loops (CSR).
+        """
+        rows = np.repeat(np.arange(self.size), [len(_) for _ in self.neighbors])
+        cols = np.fromiter((j for _ in self.neighbors for j in _), dtype=np.int64, count=len(rows))
+        nodes = np.arange(self.size)
+        return sp.csr_matrix(
+            (np.ones(len(rows) + self.size), (np.concatenate([rows, nodes]), np.concatenate([cols, nodes]))),
+            shape=(self.size, self.size),
+        )
+
+    def matrix(self, t=None):
+        """
+        Current weight matrix (CSR), the same for every round until the next change.
+        """
+        if self._W is not None:
+            return self._W
+        if self.weighting == "metropolis":
+            pairs = np.array(list(self.edge_weight.keys()), dtype=np.int64).reshape(-1, 2)
+            weights = np.fromiter(self.edge_weight.values(), dtype=float, count=len(pairs))
+            nodes = np.arange(self.size)
+            self._W = sp.csr_matrix(
+                (
+                    np.concatenate([weights, weights, self.diagonal]),
+                    (
+                        np.concatenate([pairs[:, 0], pairs[:, 1], nodes]),
+                        np.concatenate([pairs[:, 1], pairs[:, 0], nodes]),
+                    ),
+                ),
+                shape=(self.size, self.size),
+            )
+        else:
+            A = self.adjacency()
+            if not self.balanced:
+                self.r, self.c = sinkhorn_scaling(A, self.max_iterations, self.tolerance, c=self.c)
+                self.balanced = True
+            self._W = sp.csr_matrix(sp.diags(self.r) @ A @ sp.diags(self.c))
+        return self._W
+
+    def node_messages(self, t):
+        return np.array([len(_) for _ in self.neighbors])
+
+    def mix(self, theta, t):
+        W = self.matrix()
+        theta = np.asarray(theta)
+        if theta.ndim == 2:
+            return W @ theta
+        stacked = np.moveaxis(theta, -2, 0)  # (n, ..., p) -> one sparse product for all leading axes
+        return np.moveaxis((W @ stacked.reshape(self.size, -1)).reshape(stacked.shape), 0, -2)
+
+    def second_singular_value(self):
+        """
+        ||W - 11^T / n||_2 of the current weights. Large graphs iterate on the
+        positive semidefinite operator W - J (Metropolis weights have
+        diagonal entries >= 1/2) or (W - J)^T (W - J) (Sinkhorn): Lanczos the
+        first time, then LOBPCG started from the previous leading
+        eigenvector, which a local change barely moves.
+        """
+        W = self.matrix()
+        if self.size <= spectral.DENSE_MAX_SIZE:
+            return spectral.second_singular_value(W)
+        operator = spectral.centered_operator(W)
+        if self.weighting == "sinkhorn":
+            centered = operator
+            operator = sla.LinearOperator(
+                (self.size, self.size), matvec=lambda x: centered.rmatvec(centered.matvec(x)), dtype=float
+            )
+        if self._vector is None:
+            values, vectors = sla.eigsh(operator, k=1, which="LA")
+        else:
+            with warnings.catch_warnings():  # LOBPCG warns when it stops at maxiter
+                warnings.simplefilter("ignore")
+                values, vectors = sla.lobpcg(
+                    operator, self._vector[:, np.newaxis], largest=True, tol=self.tolerance, maxiter=100
+                )
+        self._vector = vectors[:, 0]
+        value = max(values[0], 0)
+        return float(np.sqrt(value) if self.weighting == "sinkhorn" else value)
+
+    def __repr__(self):
+        edges = sum(len(_) for _ in self.neighbors) // 2
+        return f"{type(self).__name__}(size={self.size}, edges={edges}, weighting={self.weighting})"
@@ -0,0 +1,135 @@
+########################################################################################################################
+####---------------------------------------------------Reorder------------------------------------------------------####
+########################################################################################################################
+
+## Used to relabel the nodes of a network so that the nonzeros of the mixing matrix gather around the diagonal (small
+## bandwidth): neighbors get nearby indices, and a gossip step W @ theta reads nearby rows of theta. The permutation
+## is applied consistently to W, the data shards of the problem and the parameters, and undone for reporting.
+
+import numpy as np
+from scipy import sparse as sp
+from scipy.sparse import csgraph
+
+
+def bandwidth(matrix):
+    """
+    max |i - j| over the nonzero entries of a dense or sparse matrix.
+    """
+    entries = sp.coo_matrix(matrix)
+    entries.eliminate_zeros()
+    if entries.nnz == 0:
+        return 0
+    return int(np.max(np.abs(entries.row - entries.col)))
+
+
+def rcm_order(matrix):
+    """
+    Reverse Cuthill-McKee ordering of the graph of matrix (edges in either
+    direction count). order[k] is the node placed at position k.
+    """
+    pattern = sp.csr_matrix(matrix, dtype=float)
+    pattern = abs(pattern) + abs(pattern.T)
+    return csgraph.reverse_cuthill_mckee(sp.csr_matrix(pattern), symmetric_mode=True).astype(np.int64)
+
+
+def hilbert_index(coordinates, level=16):
+    """
+    Position along the Hilbert curve of 2-D points, after scaling the
+    bounding box to a 2^level x 2^level grid. Points close on the curve are
+    close in the plane.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    low, high = coordinates.min(axis=0), coordinates.max(axis=0)
+    side = 1 << level
+    scaled = (coordinates - low) / np.where(high > low, high - low, 1) * side
+    x, y = np.clip(scaled, 0, side - 1).astype(np.int64).T
+    index = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        ## rotate the quadrant so that the sub-curve has the standard orientation
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return index
+
+
+def hilbert_order(coordinates, level=16):
+    """
+    Nodes sorted along the Hilbert curve of their coordinates.
+    """
+    return np.argsort(hilbert_index(coordinates, level), kind="stable")
+
+
+class Node_ordering:
+    """
+    Relabeling of the nodes: working node k is original node order[k], and
+    original node i is working node inverse[i].
+    """
+
+    def __init__(self, order):
+        self.order = np.asarray(order, dtype=np.int64)
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(len(self.order))
+
+    @classmethod
+    def rcm(cls, matrix):
+        return cls(rcm_order(matrix))
+
+    @classmethod
+    def hilbert(cls, coordinates):
+        return cls(hilbert_order(coordinates))
+
+    def matrix(self, matrix):
+        """
+        P W P^T: W in the working labels (dense or sparse like matrix).
+        """
+        if sp.issparse(matrix):
+            return sp.csr_matrix(matrix)[self.order][:, self.order]
+        return np.asarray(matrix)[np.ix_(self.order, self.order)]
+
+    def parameters(self, theta):
+        """
+        Node parameters (..., n, p) in the working labels.
+        """
+        return np.asarray(theta)[..., self.order, :]
+
+    def restore(self, theta):
+        """
+        Node parameters (..., n, p) in the working labels back in the original labels.
+        """
+        return np.asarray(theta)[..., self.inverse, :]
+
+    def restore_nodes(self, values):
+        """
+        Per-node values (..., n) in the working labels back in the original labels.
+        """
+        return np.asarray(values)[..., self.inverse]
+
+    def problem(self, prd):
+        """
+        Move the local data of the nodes of prd in place (LR_L2, LR_L4 or
+        LR_pairs), so that working node k holds the shard of original node
+        order[k]. The global training set is reordered to match the shards
+        of unbalanced problems. prd.node_ordering records the permutation,
+        used to report per-node results in the original labels.
+        """
+        if getattr(prd, "node_ordering", None) is not None:
+            raise ValueError("the nodes of this problem are already reordered")
+        prd.X = prd.X[self.order]
+        if getattr(prd, "pairs", None) is not None:
+            prd.C = prd.C[self.order]
+            prd.Y = prd.Y[:, self.order]
+        else:
+            prd.Y = prd.Y[self.order]
+        prd.data_distr = prd.data_distr[self.order]
+        if not prd.balanced:
+            prd.X_train = np.concatenate(list(prd.X))
+            prd.Y_train = np.concatenate(list(prd.Y))
+            prd.split_vec = np.cumsum(prd.data_distr)[:-1]
+        prd.node_ordering = self
+        return prd
@@ -0,0 +1,485 @@
+########################################################################################################################
+####---------------------------------------------------Schedule-----------------------------------------------------####
+########################################################################################################################
+
+## Used to run gossip with a mixing matrix W(t) that changes from round to round. A schedule applies round t with
+## mix(theta, t) without forming W(t); the optimizers reach both fixed matrices and schedules through Gossip.
+
+import math
+import time
+import numpy as np
+from scipy import sparse as sp
+import spectral
+from graph import Ring_graph, Weight_matrix
+
+
+LATENCY = 5e-6  # seconds per message of the communication time model
+BANDWIDTH = 1.25e9  # bytes per second a node sends (10 Gbit/s)
+
+
+class Gossip:
+    """
+    The consecutive gossip rounds of one training run: weight @ theta for a
+    fixed matrix, round t = 0, 1, ... of a schedule. Every Gossip keeps its
+    own round counter, so the parameters and the gradient tracker each see
+    the full sequence W(0), W(1), ... It also counts the rounds by kind and
+    what every node sent: one message per off-diagonal nonzero W_ij (node j
+    sends its row to node i), of the row's scalars at theta's itemsize.
+    The modeled communication time of a round is that of the busiest node,
+    which sends its messages one after the other:
+        max_j messages_j * LATENCY + bytes_j / BANDWIDTH,
+    and the measured time of the mixing products is kept next to it.
+    For an ensemble theta of shape (E, n, p) the members are independent
+    runs: bytes, comm_time and the ledger hold one entry per member.
+    """
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.t = 0
+        kinds = weight.kinds if isinstance(weight, Gossip_schedule) else Gossip_schedule.kinds
+        self.counts = dict.fromkeys(kinds, 0)  # rounds applied so far, by kind
+        self.bytes = 0  # bytes sent so far by all nodes, (E,) for an ensemble
+        self.ledger = None  # messages, scalars and bytes sent so far by every node, (E, n) for an ensemble
+        self.comm_time = 0.0  # modeled seconds of communication so far, (E,) for an ensemble
+        self.mix_time = 0.0  # measured seconds of the mixing products so far
+        self._node_messages = None  # messages per round of a fixed matrix, by sender
+
+    def __call__(self, theta):
+        self.count(theta, np.shape(theta)[-1] * np.asarray(theta).itemsize)
+        theta = self.apply(theta)
+        self.t += 1
+        return theta
+
+    def push_sum(self, theta, Y):
+        """
+        Round t of push-sum: the parameters theta (n, p) and the weights Y (n,)
+        travel in the same message of p + 1 scalars.
+        """
+        p = np.shape(theta)[-1]
+        self.count(theta, (p + 1) * np.asarray(theta).itemsize, p + 1)
+        theta, Y = self.apply(theta), self.apply(Y)
+        self.t += 1
+        return theta, Y
+
+    def apply(self, theta):
+        start = time.perf_counter()
+        theta = self.mix(theta)
+        self.mix_time += time.perf_counter() - start
+        return theta
+
+    def mix(self, theta):
+        if isinstance(self.weight, Gossip_schedule):
+            return self.weight.mix(theta, self.t)
+        return self.weight @ theta  # dense, sparse or an (E, n, n) stack
+
+    def node_messages(self):
+        """
+        Messages every node sends in round t, (E, n) for an (E, n, n) stack of per-member matrices.
+        """
+        if isinstance(self.weight, Gossip_schedule):
+            return self.weight.node_messages(self.t)
+        if self._node_messages is None:
+            self._node_messages = sent_messages(self.weight)
+        return self._node_messages
+
+    def messages(self):
+        return int(np.sum(self.node_messages()))
+
+    def count(self, theta, row_bytes, row_scalars=None, sent=None):
+        """
+        Account round t for parameters theta of shape (..., n, p), every
+        message carrying row_bytes and row_scalars (default p). Every member
+        (leading axes of theta) is counted on its own. sent (n,) overrides
+        the messages of every node (default node_messages).
+        """
+        if isinstance(self.weight, Gossip_schedule):
+            self.counts[self.weight.kind(self.t)] += 1
+        else:
+            self.counts["gossip"] += 1
+        if row_scalars is None:
+            row_scalars = np.shape(theta)[-1]
+        sent = np.asarray(self.node_messages() if sent is None else sent)
+        # members share a fixed matrix or schedule; a stack has one row per member already
+        sent = np.broadcast_to(sent, np.shape(theta)[:-2] + sent.shape[-1:])
+        if self.ledger is None:
+            self.ledger = {key: np.zeros(sent.shape, dtype=np.int64) for key in ("messages", "scalars", "bytes")}
+        self.ledger["messages"] += sent
+        self.ledger["scalars"] += sent * row_scalars
+        self.ledger["bytes"] += sent * row_bytes
+        self.bytes = self.bytes + np.sum(sent, axis=-1) * row_bytes
+        self.comm_time = self.comm_time + np.max(sent * LATENCY + sent * row_bytes / BANDWIDTH, axis=-1, initial=0)
+
+    def start_epoch(self, k):
+        if isinstance(self.weight, Gossip_schedule):
+            self.weight.start_epoch(k)
+
+
+def sent_messages(matrix):
+    """
+    Off-diagonal nonzeros of every column j of a matrix, or of every
+    matrix of an (E, n, n) stack: the messages node j sends in one round.
+    """
+    if sp.issparse(matrix):
+        matrix = sp.coo_matrix(matrix)
+        off_diagonal = (matrix.data != 0) & (matrix.row != matrix.col)
+        return np.bincount(matrix.col[off_diagonal], minlength=matrix.shape[1])
+    matrix = np.asarray(matrix)
+    nonzeros = np.count_nonzero(matrix, axis=-2) - (np.diagonal(matrix, axis1=-2, axis2=-1) != 0)
+    return nonzeros
+
+
+class Ring_all_reduce(Gossip):
+    """
+    comm_type "all_avg": every node gets the exact average of the nodes,
+    computed as one O(n p) mean. The communication follows a ring
+    all-reduce: the rows are cut into n chunks of at most ceil(p / n)
+    scalars; in each of n - 1 reduce-scatter steps every node sends one
+    chunk to its successor, which adds it to its own, so that every node
+    ends with the sum of one chunk, and n - 1 all-gather steps pass the
+    sums around. Every node sends 2 (n - 1) messages of one chunk per
+    average.
+    """
+
+    def __init__(self, number_of_nodes):
+        super().__init__(None)
+        self.size = number_of_nodes
+
+    def __call__(self, theta):
+        chunk = math.ceil(np.shape(theta)[-1] / self.size)
+        self.count(theta, chunk * np.asarray(theta).itemsize, chunk)
+        theta = self.apply(theta)
+        self.t += 1
+        return theta
+
+    def mix(self, theta):
+        mean = np.mean(theta, axis=-2, keepdims=True)
+        return np.repeat(mean, self.size, axis=-2)
+
+    def node_messages(self):
+        return np.full(self.size, 2 * (self.size - 1))
+
+
+def record_rounds(round_counts, *gossips):
+    """
+    Append the rounds applied so far by gossips (summed by kind, saved as
+    f"{kind}rounds"), the bytes they sent ("bytes"), the modeled
+    communication and measured mixing seconds ("commtime", "mixtime"),
+    and the ledger of every
+    node ("nodemessages", "nodescalars", "nodebytes", and e.g. "nodeskipped"
+    of compression.Event_gossip: one row per call, one column per node) to
+    the lists of round_counts, e.g. once per epoch. The entries of an
+    ensemble have a member axis before the nodes (see Gossip); the rounds
+    and the mixing time are shared. No-op if None.
+    """
+    if round_counts is None:
+        return
+    for kind in gossips[0].counts:
+        round_counts.setdefault(f"{kind}rounds", []).append(sum(gossip.counts[kind] for gossip in gossips))
+    round_counts.setdefault("bytes", []).append(sum(gossip.bytes for gossip in gossips))
+    round_counts.setdefault("commtime", []).append(sum(gossip.comm_time for gossip in gossips))
+    round_counts.setdefault("mixtime", []).append(sum(gossip.mix_time for gossip in gossips))
+    ledgers = [gossip.ledger for gossip in gossips if gossip.ledger is not None]
+    for key in dict.fromkeys(key for ledger in ledgers for key in ledger):
+        round_counts.setdefault(f"node{key}", []).append(sum(ledger.get(key, 0) for ledger in ledgers))
+
+
+class Gossip_schedule:
+    """
+    Periodic sequence of doubly stochastic matrices W(0), ..., W(period - 1)
+    on size nodes. Subclasses define matrix(t) and, for O(n p) rounds, mix.
+    Rounds of different cost (e.g. intra- and inter-cluster) are told apart
+    by kind(t), one of kinds.
+    """
+
+    kinds = ("gossip",)
+
+    def __init__(self, number_of_nodes, period):
+        self.size = number_of_nodes
+        self.period = period
+
+    def matrix(self, t):
+        raise NotImplementedError
+
+    def kind(self, t):
+        return "gossip"
+
+    def node_messages(self, t):
+        """
+        Messages every node sends in round t (off-diagonal nonzeros of its column of W(t)).
+        """
+        return sent_messages(self.matrix(t))
+
+    def messages(self, t):
+        return int(np.sum(self.node_messages(t)))
+
+    def start_epoch(self, k):
+        """
+        Called by the optimizers at the start of epoch k of a run, e.g. to
+        change a dynamic topology (dynamic.Dynamic_topology).
+        """
+
+    def mix(self, theta, t):
+        """
+        W(t) @ theta for node parameters of shape (..., n, p).
+        """
+        return np.matmul(self.matrix(t), theta)
+
+    def period_matrix(self):
+        """
+        W(period - 1) ... W(1) W(0), the mixing of one full period.
+        """
+        product = np.identity(self.size)
+        for t in range(self.period):
+            product = self.mix(product, t)
+        return product
+
+    def second_singular_value(self):
+        """
+        Contraction factor per round, averaged over a period:
+        ||W(period - 1) ... W(0) - 11^T / n||^(1 / period).
+        """
+        return spectral.second_singular_value(self.period_matrix()) ** (1 / self.period)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(size={self.size}, period={self.period})"
+
+
+class One_peer_exponential_schedule(Gossip_schedule):
+    """
+    At round t every node i averages with the single node (i + 2^(t mod tau)) mod n,
+    tau = ceil(log2(n)): W(t) = (I + P^hop) / 2 with the cyclic shift P. Each
+    node sends one and receives one message per round, and for n a power of
+    two the product of tau consecutive rounds is exactly 11^T / n.
+    """
+
+    def __init__(self, number_of_nodes):
+        super().__init__(number_of_nodes, max(1, math.ceil(math.log2(number_of_nodes))))
+
+    def hop(self, t):
+        return 2 ** (t % self.period) % self.size
+
+    def matrix(self, t):
+        identity = np.identity(self.size)
+        return (identity + np.roll(identity, self.hop(t), axis=1)) / 2
+
+    def mix(self, theta, t):
+        return (theta + np.roll(theta, -self.hop(t), axis=-2)) / 2
+
+    def node_messages(self, t):
+        return np.full(self.size, 1 if self.hop(t) else 0)
+
+
+class Hierarchical_schedule(Gossip_schedule):
+    """
+    Two-level network: the nodes form clusters of consecutive indices (racks)
+    that average exactly in "intra" rounds, and every inter_every-th round is
+    an "inter" round in which only the gateways (first node of each cluster)
+    gossip over a ring of clusters with Metropolis weights while the other
+    nodes keep their parameters. The next intra round spreads what the
+    gateways received over their cluster.
+    """
+
+    kinds = ("intra", "inter")
+
+    def __init__(self, number_of_nodes, clusters, inter_every=4):
+        if inter_every < 2:
+            raise ValueError("inter_every must be at least 2 so that clusters average between inter rounds")
+        super().__init__(number_of_nodes, inter_every)
+        self.clusters = clusters
+        self.inter_every = inter_every
+        self.cluster_sizes = np.array([len(_) for _ in np.array_split(np.arange(number_of_nodes), clusters)])
+        self.gateways = np.concatenate([[0], np.cumsum(self.cluster_sizes)[:-1]])  # first node of each cluster
+        self.gateway_weight = Weight_matrix(Ring_graph(clusters).undirected()).metroplis()
+
+    def kind(self, t):
+        return "inter" if t % self.inter_every == self.inter_every - 1 else "intra"
+
+    def matrix(self, t):
+        W = np.identity(self.size)
+        if self.kind(t) == "inter":
+            W[np.ix_(self.gateways, self.gateways)] = self.gateway_weight
+        else:
+            for start, size in zip(self.gateways, self.cluster_sizes):
+                W[start : start + size, start : start + size] = 1 / size
+        return W
+
+    def mix(self, theta, t):
+        if self.kind(t) == "inter":
+            theta = np.array(theta, dtype=float)
+            theta[..., self.gateways, :] = np.matmul(self.gateway_weight, theta[..., self.gateways, :])
+            return theta
+        means = np.add.reduceat(theta, self.gateways, axis=-2) / self.cluster_sizes[:, np.newaxis]
+        return np.repeat(means, self.cluster_sizes, axis=-2)
+
+    def node_messages(self, t):
+        if self.kind(t) == "inter":
+            sent = np.zeros(self.size, dtype=np.int64)
+            sent[self.gateways] = sent_messages(self.gateway_weight)
+            return sent
+        return np.repeat(self.cluster_sizes - 1, self.cluster_sizes)
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(size={self.size}, clusters={self.clusters}, inter_every={self.inter_every})"
+        )
+
+
+def greedy_edge_coloring(rows, cols, n):
+    """
+    Colors of the undirected edges (rows[e], cols[e]) such that the edges of
+    a color form a matching: every edge takes the smallest color unused at
+    both endpoints, edges at high-degree nodes first. At most 2 max_degree - 1
+    colors.
+    """
+    degree = np.bincount(rows, minlength=n) + np.bincount(cols, minlength=n)
+    colors = np.empty(len(rows), dtype=np.int64)
+    used = [set() for _ in range(n)]
+    for e in np.argsort(-(degree[rows] + degree[cols]), kind="stable"):
+        i, j = rows[e], cols[e]
+        color = 0
+        while color in used[i] or color in used[j]:
+            color += 1
+        colors[e] = color
+        used[i].add(color)
+        used[j].add(color)
+    return colors
+
+
+class Matching_schedule(Gossip_schedule):
+    """
+    The edges of an undirected graph split into matchings by edge coloring,
+    one matching per round: the two ends of every edge of the matching move
+    weight of the way towards each other (weight = 1/2: pairwise average),
+    all other nodes keep their parameters. Every node exchanges with at most
+    one neighbor per round, and a round costs O(n p). The product over a
+    period is symmetric, doubly stochastic and contracts for a connected
+    graph, since every edge is used once per period.
+    """
+
+    def __init__(self, adjacency, weight=0.5):
+        edges = sp.triu(sp.csr_matrix(adjacency), k=1).tocoo()  # i < j, self loops dropped
+        n = adjacency.shape[0]
+        colors = greedy_edge_coloring(edges.row, edges.col, n)
+        super().__init__(n, int(colors.max()) + 1 if len(colors) else 1)
+        self.weight = weight
+        self.matchings = [(edges.row[colors == c], edges.col[colors == c]) for c in range(self.period)]
+
+    def matrix(self, t):
+        i, j = self.matchings[t % self.period]
+        W = np.identity(self.size)
+        W[i, i] = W[j, j] = 1 - self.weight
+        W[i, j] = W[j, i] = self.weight
+        return W
+
+    def mix(self, theta, t):
+        i, j = self.matchings[t % self.period]
+        theta = np.array(theta, dtype=float)
+        difference = theta[..., j, :] - theta[..., i, :]
+        theta[..., i, :] += self.weight * difference
+        theta[..., j, :] -= self.weight * difference
+        return theta
+
+    def node_messages(self, t):
+        i, j = self.matchings[t % self.period]
+        sent = np.zeros(self.size, dtype=np.int64)
+        sent[i] += 1
+        sent[j] += 1
+        return sent
+
+    def __repr__(self):
+        edges = sum(len(i) for i, j in self.matchings)
+        return f"{type(self).__name__}(size={self.size}, edges={edges}, period={self.period})"
+
+
+class Consensus_control:
+    """
+    Settings of comm_type "adaptive": the optimizers gossip every period
+    steps, rounds rounds in a row, and adapt both to keep the consensus
+    error (1/n) sum_i ||theta_i - mean theta||^2 after the gossip below
+        target * learning_rate^2 * (1/n) sum_i ||grad_i||^2,
+    a multiple of the mean squared length of the local steps. Unlike the
+    norm of the average gradient, the local gradients keep their
+    heterogeneity and noise at convergence, so the target does not vanish.
+    The error and the gradient norms are estimated on coordinates random
+    per check, O(n coordinates) each, and smoothed over the checks. Above
+    the target the period halves, then the rounds grow (up to max_rounds,
+    never below the starting rounds); below target / 4 the rounds drop,
+    then the period doubles.
+
+    Communication goes down against a fixed setting that mixes more than
+    needed to stay within target local steps of consensus (many rounds per
+    step, or a well connected graph); on a slowly mixing graph with a tight
+    target the controller adds rounds instead.
+    """
+
+    def __init__(self, target=1.0, max_period=64, max_rounds=8, coordinates=32, smoothing=0.5, seed=0):
+        self.target = target
+        self.max_period = max_period
+        self.max_rounds = max_rounds
+        self.coordinates = coordinates
+        self.smoothing = smoothing
+        self.seed = seed
+
+    def controller(self, comm_round):
+        """
+        The control of one training run, starting from the fixed setting
+        comm_round (> 0: gossip every comm_round steps, < 0: -comm_round
+        rounds every step).
+        """
+        period, rounds = (comm_round, 1) if comm_round > 0 else (1, max(1, -comm_round))
+        return Consensus_controller(self, period, rounds)
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(target={self.target}, max_period={self.max_period}, "
+            f"max_rounds={self.max_rounds})"
+        )
+
+
+class Consensus_controller:
+    def __init__(self, control, period, rounds):
+        self.control = control
+        self.period = period
+        self.rounds = rounds
+        self.rng = np.random.default_rng(control.seed)
+        self.step = 0
+        self.error = None  # smoothed estimates of the consensus error and the mean squared local step
+        self.progress = None
+
+    def __call__(self, theta, grad, learning_rate, gossip):
+        """
+        One optimizer step with parameters theta (n, p) after the update
+        with the node gradients grad (n, p): gossip if the period is over.
+        """
+        self.step += 1
+        if self.step < self.period:
+            return theta
+        self.step = 0
+        for _ in range(self.rounds):
+            theta = gossip(theta)
+        self.adapt(theta, grad, learning_rate)
+        return theta
+
+    def adapt(self, theta, grad, learning_rate):
+        p = np.shape(theta)[-1]
+        columns = self.rng.choice(p, size=min(p, self.control.coordinates), replace=False)
+        sample = theta[:, columns]
+        error = np.mean(np.sum((sample - np.mean(sample, axis=0)) ** 2, axis=1)) * p / len(columns)
+        progress = learning_rate**2 * np.mean(np.sum(grad[:, columns] ** 2, axis=1)) * p / len(columns)
+        if self.error is None:
+            self.error, self.progress = error, progress
+        else:
+            s = self.control.smoothing
+            self.error = s * self.error + (1 - s) * error
+            self.progress = s * self.progress + (1 - s) * progress
+        target = self.control.target * self.progress
+        if self.error > target:
+            if self.period > 1:
+                self.period //= 2
+            else:
+                self.rounds = max(self.rounds, min(self.rounds + 1, self.control.max_rounds))
+        elif self.error < target / 4:
+            if self.rounds > 1:
+                self.rounds -= 1
+            else:
+                self.period = min(2 * self.period, self.control.max_period)
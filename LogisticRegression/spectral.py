@@ -0,0 +1,172 @@
+########################################################################################################################
+####---------------------------------------------------Spectral-----------------------------------------------------####
+########################################################################################################################
+
+## Used to analyse mixing matrices: second largest singular value, spectral gap, mixing time and primitivity
+
+import math
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from scipy import sparse as sp
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as sla
+
+DENSE_MAX_SIZE = 500  # matrices up to this size use dense symmetric eigensolvers, larger ones Lanczos
+CACHE_SIZE = 128  # number of (matrix, quantity) results kept
+
+_cache = OrderedDict()
+
+
+def fingerprint(matrix):
+    """
+    Digest of the shape and entries of a dense or sparse matrix, used as the
+    cache key of the spectral quantities.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        matrix.sort_indices()
+        digest.update(b"csr")
+        for array in (matrix.indptr, matrix.indices, matrix.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        matrix = np.ascontiguousarray(matrix, dtype=float)
+        digest.update(b"dense")
+        digest.update(matrix.tobytes())
+    digest.update(str(matrix.shape).encode())
+    return digest.hexdigest()
+
+
+def cached(function):
+    """
+    Cache function(matrix, *args) by the fingerprint of matrix.
+    """
+
+    def wrapper(matrix, *args):
+        key = (function.__name__, fingerprint(matrix), args)
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        value = function(matrix, *args)
+        _cache[key] = value
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+        return value
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def is_symmetric(matrix, tolerance=1e-12):
+    if sp.issparse(matrix):
+        difference = abs(matrix - matrix.T)
+        return difference.nnz == 0 or difference.max() <= tolerance
+    return np.allclose(matrix, matrix.T, rtol=0, atol=tolerance)
+
+
+def centered_operator(matrix):
+    """
+    W - 11^T / n as a LinearOperator, without forming the dense rank-one
+    term, so that sparse W stays sparse.
+    """
+    n = matrix.shape[0]
+
+    def matvec(x):
+        x = np.ravel(x)
+        return matrix @ x - np.mean(x)
+
+    def rmatvec(x):
+        x = np.ravel(x)
+        return matrix.T @ x - np.mean(x)
+
+    return sla.LinearOperator((n, n), matvec=matvec, rmatvec=rmatvec, dtype=float)
+
+
+@cached
+def second_singular_value(matrix):
+    """
+    Largest singular value of W - 11^T / n, i.e. the contraction factor of
+    one gossip round on the disagreement (lambda of a doubly stochastic W).
+    Symmetric W: largest |eigenvalue|, nonsymmetric W: square root of the
+    largest eigenvalue of (W - J)^T (W - J). Small matrices use dense
+    symmetric solvers, large or sparse ones Lanczos on the implicit operator.
+    """
+    n = matrix.shape[0]
+    if n == 1:
+        return 0.0
+    symmetric = is_symmetric(matrix)
+    if n <= DENSE_MAX_SIZE:
+        centered = (matrix.toarray() if sp.issparse(matrix) else np.asarray(matrix)) - 1 / n
+        if symmetric:
+            return float(np.max(np.abs(np.linalg.eigvalsh(centered))))
+        return float(np.sqrt(max(np.max(np.linalg.eigvalsh(centered.T @ centered)), 0)))
+
+    operator = centered_operator(matrix)
+    if symmetric:
+        values = sla.eigsh(operator, k=1, which="LM", return_eigenvectors=False)
+        return float(np.max(np.abs(values)))
+    values = sla.svds(operator, k=1, return_singular_vectors=False)
+    return float(np.max(values))
+
+
+def spectral_gap(matrix):
+    return 1 - second_singular_value(matrix)
+
+
+def mixing_time(matrix, epsilon=1e-2):
+    """
+    Number of gossip rounds t with lambda^t <= epsilon, i.e. after which the
+    disagreement has contracted by a factor epsilon (inf if lambda >= 1).
+    """
+    return contraction_rounds(second_singular_value(matrix), epsilon)
+
+
+def contraction_rounds(lambd, epsilon):
+    """
+    Fewest rounds t >= 1 with lambd^t <= epsilon (inf if lambd >= 1).
+    """
+    if lambd <= 0:
+        return 1
+    if lambd >= 1:
+        return math.inf
+    return max(1, math.ceil(math.log(epsilon) / math.log(lambd)))
+
+
+@cached
+def is_primitive(matrix):
+    """
+    A nonnegative matrix is primitive (some power is entrywise positive) iff
+    its graph is strongly connected and aperiodic. The period is the gcd of
+    level[u] + 1 - level[v] over all edges u -> v, with BFS levels from node 0.
+    """
+    A = sp.csr_matrix(matrix)
+    if A.nnz and A.data.min() < 0:
+        return False
+    A.eliminate_zeros()
+    n = A.shape[0]
+    n_components = csgraph.connected_components(
+        A, directed=True, connection="strong", return_labels=False
+    )
+    if n_components != 1:
+        return False
+    if n == 1:
+        return A.nnz > 0
+
+    level = csgraph.shortest_path(A, method="D", unweighted=True, indices=0)
+    edges = A.tocoo()
+    period = np.gcd.reduce(
+        np.abs(level[edges.row] + 1 - level[edges.col]).astype(np.int64)
+    )
+    return bool(period == 1)
+
+
+def second_singular_values(matrices):
+    """
+    second_singular_value of every matrix of a dense (B, n, n) stack, with one
+    batched symmetric eigensolver call (no caching).
+    """
+    centered = np.asarray(matrices) - 1 / matrices.shape[-1]
+    gram = np.swapaxes(centered, -1, -2) @ centered
+    return np.sqrt(np.maximum(np.linalg.eigvalsh(gram)[..., -1], 0))
@@ -0,0 +1,445 @@
+########################################################################################################################
+####-------------------------------------------------Parameter Sweep------------------------------------------------####
+########################################################################################################################
+
+## Used to dispatch the configurations of a sweep (see Algos.centralized_algo / decentralized_algo) to worker processes
+
+import os
+import math
+import time
+import hashlib
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from contextlib import contextmanager
+import numpy as np
+from analysis import error, test_error
+from schedule import Gossip_schedule, Ring_all_reduce
+
+BLAS_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+_worker_shared = {}  # objects rebuilt from shared memory, one copy per worker
+_worker_segments = []  # keeps the attached segments alive for the worker's lifetime
+
+
+@contextmanager
+def blas_threads_env(num_threads):
+    """
+    Temporarily cap the BLAS thread count through the environment. Only
+    processes that load their BLAS library inside the context are affected,
+    i.e. freshly spawned workers.
+    """
+    saved = {var: os.environ.get(var) for var in BLAS_ENV_VARS}
+    for var in BLAS_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def limit_blas_threads(num_threads):
+    """
+    Cap the BLAS thread count of the current (already initialized) process.
+    Needs threadpoolctl, which ships with scikit-learn; silently does nothing
+    without it.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return None
+    return threadpool_limits(limits=num_threads)
+
+
+def available_memory():
+    """
+    Bytes of RAM currently available to new processes. Uses psutil when it is
+    installed, the POSIX sysconf counters otherwise.
+    """
+    try:
+        import psutil
+
+        return psutil.virtual_memory().available
+    except ImportError:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def _attach_array(spec):
+    name, shape, dtype = spec
+    segment = shared_memory.SharedMemory(name=name)
+    _worker_segments.append(segment)
+    array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    array.flags.writeable = False
+    return array
+
+
+def _attach_object(spec):
+    cls, arrays, others = spec
+    obj = cls.__new__(cls)  # skip __init__: no data loading / preprocessing in workers
+    obj.__dict__.update(others)
+    for key, array_spec in arrays.items():
+        setattr(obj, key, _attach_array(array_spec))
+    return obj
+
+
+def _init_worker(spec, blas_threads):
+    limit_blas_threads(blas_threads)
+
+    logis_model = _attach_object(spec["logis_model"])
+    _worker_shared["logis_model"] = logis_model
+
+    kind, weight = spec["communication_matrix"]
+    _worker_shared["communication_matrix"] = (
+        _attach_array(weight) if kind == "shm" else weight
+    )
+
+    if spec["error_lr"] is None:
+        _worker_shared["error_lr"] = None
+    else:
+        theta_opt, F_opt = spec["error_lr"]
+        _worker_shared["error_lr"] = error(logis_model, theta_opt, F_opt)
+
+    if spec["test_eval"] is None:
+        _worker_shared["test_eval"] = None
+    else:
+        _worker_shared["test_eval"] = test_error(logis_model, spec["test_eval"])
+    _worker_shared["seed"] = spec["seed"]
+
+
+def _canonical(value):
+    """
+    Stable text of a job value: arrays by dtype, shape and a hash of their
+    bytes (their repr is abbreviated and depends on the print options),
+    containers element by element, settings objects by their repr.
+    """
+    if isinstance(value, np.ndarray):
+        data = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return f"array({value.dtype.str}, {value.shape}, {data})"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_canonical(item) for item in value) + "]"
+    if isinstance(value, np.generic):
+        value = value.item()
+    return repr(value)
+
+
+def job_seed(seed, job):
+    """
+    Seed of one job: a hash of the sweep seed and the job's configuration
+    (without path_every, which Sweep_cost_model.fit may change).
+    """
+    key = ", ".join(f"{name}={_canonical(job[name])}" for name in sorted(job) if name != "path_every")
+    digest = hashlib.sha256(f"{seed}:{key}".encode()).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def _run_job(fn, job, shared):
+    # forked workers inherit the parent's np.random state: reseed so that jobs draw independent, reproducible samples
+    np.random.seed(job_seed(_worker_shared["seed"], job))
+    kwargs = {name: _worker_shared[name] for name in shared}
+    return fn(**kwargs, **job)
+
+
+class Sweep_cost_model:
+    """
+    Peak memory and runtime estimates for the jobs built by
+    Algos.centralized_algo / decentralized_algo.
+
+    Memory is the sum of the retained trajectory (held as a list and copied
+    into an array by the metrics), the (epochs, n, N) margin temporaries of
+    F_val on the whole path, and the per-step minibatch gathers. Runtime is
+    extrapolated from micro-benchmarks of the kernels the optimizers call:
+    networkgrad / grad for each batch size, one gossip product (or average
+    of comm_type "all_avg"), and the
+    F_val / F_grad calls made by the error class.
+    """
+
+    def __init__(self, logis_model, communication_matrix=None, repeats=3):
+        self.pr = logis_model
+        self.weight = communication_matrix
+        self.repeats = repeats
+        self.n = logis_model.n
+        self.p = logis_model.p
+        self.N = logis_model.N
+        self.N_local = len(logis_model.X[0])
+        self.N_test = len(getattr(logis_model, "Y_test", []))
+        self.itemsize = 8
+
+        theta = np.zeros((self.n, self.p))
+        self.t_F_val = self._benchmark(lambda: self.pr.F_val(theta[0]))
+        self.t_F_grad = self._benchmark(lambda: self.pr.F_grad(theta[0]))
+        if isinstance(self.weight, Gossip_schedule):
+            self.t_mix = self._benchmark(lambda: self.weight.mix(theta, 0))
+        elif self.weight is not None:  # dense or sparse matrix
+            self.t_mix = self._benchmark(lambda: self.weight @ theta)
+        else:
+            self.t_mix = 0.0
+        self.t_all_reduce = self._benchmark(lambda: Ring_all_reduce(self.n).mix(theta))  # comm_type "all_avg"
+        self._t_networkgrad = {}
+        self._t_grad = {}
+
+    def _benchmark(self, fn):
+        best = math.inf
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def t_networkgrad(self, bz):
+        if bz not in self._t_networkgrad:
+            theta = np.zeros((self.n, self.p))
+            permute = [np.arange(min(bz, d)) for d in self.pr.data_distr]
+            self._t_networkgrad[bz] = self._benchmark(
+                lambda: self.pr.networkgrad(theta, permute=permute, permute_flag=True)
+            )
+        return self._t_networkgrad[bz]
+
+    def t_grad(self, bz):
+        if bz not in self._t_grad:
+            theta = np.zeros(self.p)
+            permute = np.arange(min(bz, self.N))
+            self._t_grad[bz] = self._benchmark(
+                lambda: self.pr.grad(theta, permute=permute, permute_flag=True)
+            )
+        return self._t_grad[bz]
+
+    def members(self, job):
+        lr = job.get("lr", 0)
+        return len(lr) if isinstance(lr, (list, tuple)) else 1
+
+    def memory(self, job):
+        """
+        Estimated peak memory in bytes of one job.
+        """
+        path_every = job.get("path_every", 1)
+        kept = job["epoch"] // path_every + 1
+        if "cr" in job:
+            models = self.n * self.members(job)
+            step = (3 * job["bz"] + 4) * models * self.p * self.itemsize
+        else:
+            models = 1
+            step = 3 * job["bz"] * self.p * self.itemsize
+        trajectory = kept * models * self.p * self.itemsize
+        copies = 2 + int(job.get("save_theta_path", False))
+        margins = 3 * kept * models * self.N * self.itemsize
+        test = 2 * 256 * self.N_test * self.itemsize
+        return trajectory * copies + max(margins, test) + step
+
+    def runtime(self, job):
+        """
+        Estimated wall time in seconds of one job.
+        """
+        epoch = job["epoch"]
+        kept = epoch // job.get("path_every", 1) + 1
+        if "cr" not in job:
+            steps = epoch * job["node_num"] * math.ceil(self.N / job["bz"])
+            metrics = kept * (self.t_F_val + 2 * self.t_F_grad)
+            return steps * self.t_grad(job["bz"]) + metrics
+
+        steps = epoch * self.n * math.ceil(self.N_local / job["bz"])
+        cr = job["cr"]
+        if job.get("comm_every_epoch", False):
+            mixes = epoch * abs(cr)
+        elif cr > 0:
+            mixes = steps / cr
+        else:
+            mixes = steps * -cr
+        if job.get("grad_track", False):
+            mixes += steps
+        metrics = kept * ((self.n + 1) * self.t_F_val + (self.n + 1) * self.t_F_grad)
+        # upper bound for ensembles, which share the per-step Python overhead
+        t_mix = self.t_all_reduce if job.get("comm_type") == "all_avg" else self.t_mix
+        per_member = steps * self.t_networkgrad(job["bz"]) + mixes * t_mix
+        return self.members(job) * (per_member + metrics)
+
+    def fit(self, job, memory_budget):
+        """
+        Thin the retained trajectory (path_every) of a decentralized job until
+        its estimated peak memory fits in memory_budget.
+        """
+        if "cr" not in job or self.memory(job) <= memory_budget:
+            return job
+        job = dict(job)
+        path_every = job.get("path_every", 1)
+        while self.memory(job) > memory_budget and path_every < job["epoch"]:
+            path_every *= 2
+            job["path_every"] = min(path_every, job["epoch"])
+        print(
+            f"Thinning trajectory of epoch = {job['epoch']}, bz = {job['bz']}, "
+            f"lr = {job['lr']}, ur = {job['cr']} to every {job['path_every']} epochs",
+            flush=True,
+        )
+        return job
+
+
+class Sweep_executor:
+    """
+    Process pool for parameter sweeps.
+
+    The preprocessed problem (its numpy arrays), the communication matrix
+    and the optimum used by the error classes are published once through
+    shared memory; workers attach to them instead of re-instantiating
+    LR_L2 / LR_L4. Each worker runs with `blas_threads` BLAS threads so that
+    max_workers * blas_threads matches the number of cores.
+
+    Usage:
+        with Sweep_executor(logis_model, W, error_lr_0, test_eval) as executor:
+            decentralized_algo(..., executor=executor)
+
+    With schedule=True, jobs are admitted by a Sweep_cost_model: longest
+    estimated runtime first, as long as the estimated peak memory of the
+    running jobs stays within memory_budget (default: 80% of the available
+    RAM). Jobs that would not fit even on their own get a thinned trajectory.
+
+    Every job reseeds np.random from the executor's seed (drawn from
+    np.random when it is created) and its configuration (see job_seed), so
+    results do not depend on the worker or on the order the jobs run in.
+
+    With the "spawn" start method the launching script must be guarded by
+    `if __name__ == "__main__":`; the default "fork" method (on POSIX) is not
+    affected.
+    """
+
+    def __init__(
+        self,
+        logis_model,
+        communication_matrix=None,
+        error_lr=None,
+        test_eval=None,
+        max_workers=None,
+        blas_threads=1,
+        mp_context=None,
+        schedule=False,
+        memory_budget=None,
+    ):
+        self.blas_threads = blas_threads
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 1) // blas_threads)
+        self.max_workers = max_workers
+        self._segments = []
+
+        self.cost_model = None
+        if schedule:
+            self.cost_model = Sweep_cost_model(logis_model, communication_matrix)
+        if memory_budget is None:
+            memory_budget = 0.8 * available_memory()
+        self.memory_budget = memory_budget
+
+        if isinstance(communication_matrix, np.ndarray):
+            weight_spec = ("shm", self._publish_array(communication_matrix))
+        else:  # None (solo graph), sparse matrices or gossip schedules
+            weight_spec = ("pickle", communication_matrix)
+
+        spec = {
+            "logis_model": self._publish_object(logis_model),
+            "communication_matrix": weight_spec,
+            "error_lr": None
+            if error_lr is None
+            else (error_lr.theta_opt, error_lr.F_opt),
+            "test_eval": None if test_eval is None else test_eval.chunk_size,
+            "seed": np.random.randint(2**31 - 1),  # seeding np.random before the sweep makes the jobs reproducible
+        }
+
+        if mp_context is None:
+            mp_context = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(mp_context)
+        with blas_threads_env(blas_threads):
+            self._pool = ctx.Pool(
+                self.max_workers,
+                initializer=_init_worker,
+                initargs=(spec, blas_threads),
+            )
+
+    def _publish_array(self, array):
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        self._segments.append(segment)
+        return (segment.name, array.shape, array.dtype.str)
+
+    def _publish_object(self, obj):
+        arrays = {}
+        others = {}
+        for key, value in vars(obj).items():
+            if isinstance(value, np.ndarray) and value.dtype != object:
+                arrays[key] = self._publish_array(value)
+            else:
+                others[key] = value
+        return (type(obj), arrays, others)
+
+    def map(self, fn, jobs, shared=("logis_model",)):
+        """
+        Run fn(**{name: shared object}, **job) for every job dict and return
+        the results in the order of jobs.
+
+        @param
+        :fn         module level function, e.g. Algos.decentralized_run
+        :jobs       list of keyword-argument dicts, one per configuration
+        :shared     names of the shared objects fn takes: "logis_model",
+                    "communication_matrix", "error_lr", "test_eval"
+        """
+        if self.cost_model is not None:
+            return self._schedule(fn, jobs, tuple(shared))
+        tasks = [(fn, job, tuple(shared)) for job in jobs]
+        return self._pool.starmap(_run_job, tasks, chunksize=1)
+
+    def _schedule(self, fn, jobs, shared):
+        jobs = [self.cost_model.fit(job, self.memory_budget) for job in jobs]
+        memory = [self.cost_model.memory(job) for job in jobs]
+        runtime = [self.cost_model.runtime(job) for job in jobs]
+        pending = sorted(range(len(jobs)), key=lambda i: -runtime[i])
+        print(
+            f"Scheduling {len(jobs)} jobs: estimated {sum(runtime):.1f} s of work, "
+            f"peak job memory {max(memory, default=0) / 2**20:.1f} MiB, "
+            f"budget {self.memory_budget / 2**20:.1f} MiB",
+            flush=True,
+        )
+
+        results = [None] * len(jobs)
+        running = {}
+        finished = queue.Queue()
+        memory_used = 0
+        while pending or running:
+            for i in list(pending):
+                if len(running) >= self.max_workers:
+                    break
+                # always admit a job on an idle machine, even if over budget
+                if memory_used + memory[i] <= self.memory_budget or not running:
+                    running[i] = self._pool.apply_async(
+                        _run_job,
+                        (fn, jobs[i], shared),
+                        callback=lambda _, i=i: finished.put(i),
+                        error_callback=lambda _, i=i: finished.put(i),
+                    )
+                    memory_used += memory[i]
+                    pending.remove(i)
+            i = finished.get()
+            results[i] = running.pop(i).get()
+            memory_used -= memory[i]
+        return results
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._pool.terminate()
+        self.close()
@@ -0,0 +1,34 @@
+import os
+import sys
+import numpy as np
+from numpy import linalg as LA
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from Problems.log_reg_cifar import LR_L4
+
+
+class Synthetic_LR(LR_L4):
+    """
+    LR_L4 on a small random data set instead of CIFAR-10: unit-norm features
+    labeled by the sign of a random linear model plus noise.
+    """
+
+    def __init__(self, n_agent, N=320, p=10, seed=0):
+        self._N, self._p, self._seed = N, p, seed
+        super().__init__(n_agent)
+
+    def load_data(self):
+        rng = np.random.default_rng(self._seed)
+        w = rng.normal(size=self._p)
+        X = rng.normal(size=(self._N + 64, self._p))
+        X /= LA.norm(X, axis=1)[:, np.newaxis]
+        Y = np.sign(X @ w + 0.1 * rng.normal(size=len(X)))
+        return X[: self._N], Y[: self._N], X[self._N :], Y[self._N :]
+
+
+@pytest.fixture
+def problem():
+    return Synthetic_LR(8)
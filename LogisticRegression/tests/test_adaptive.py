@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from analysis import error
+from schedule import Consensus_control
+from utilities import init_comm_matrix
+from Optimizers import DOPTIMIZER as dopt
+
+
+def train(problem, tmp_path, comm_round, comm_every_epoch):
+    error_lr = error(problem, np.zeros(problem.p), problem.F_val(np.zeros(problem.p)))
+    W = init_comm_matrix(problem.n, "ring", cache_dir=None)
+    round_counts = {}
+    dopt.D_RR(
+        problem, W, 0.1, 2, np.zeros((problem.n, problem.p)), 5, comm_round, False, False, False,
+        str(tmp_path), "adaptive", -1, error_lr, comm_type="adaptive", comm_every_epoch=comm_every_epoch,
+        round_counts=round_counts, adaptive=Consensus_control(),
+    )
+    return round_counts
+
+
+@pytest.mark.parametrize("comm_round", [-2, 2])
+def test_adaptive_rejects_comm_every_epoch(problem, tmp_path, comm_round):
+    with pytest.raises(ValueError, match="comm_every_epoch"):
+        train(problem, tmp_path, comm_round, comm_every_epoch=True)
+
+
+@pytest.mark.parametrize("comm_round", [-2, 2])
+def test_adaptive_gossips_between_steps(problem, tmp_path, comm_round):
+    round_counts = train(problem, tmp_path, comm_round, comm_every_epoch=False)
+    assert round_counts["gossiprounds"][-1] > 0
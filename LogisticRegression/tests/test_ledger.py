@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import Algos
+from analysis import error
+from utilities import init_comm_matrix
+
+LEDGER = ("bytes", "commtime", "nodemessages", "nodescalars", "nodebytes")
+
+
+def run(problem, tmp_path, lr, comm_type):
+    error_lr = error(problem, np.zeros(problem.p), problem.F_val(np.zeros(problem.p)))
+    W = init_comm_matrix(problem.n, "ring", cache_dir=None)
+    np.random.seed(0)
+    Algos.decentralized_run(
+        problem, W, error_lr, None, np.zeros((problem.n, problem.p)), 2, 5, lr, -1, "DRR", comm_type,
+        False, False, False, False, None, None, str(tmp_path), str(tmp_path), -1, False, False, False,
+    )
+
+
+@pytest.mark.parametrize("comm_type", ["graph_avg", "all_avg"])
+def test_ensemble_saves_the_ledger_of_a_single_run(problem, tmp_path, comm_type):
+    lrs = [0.1, 0.2, 0.3]
+    (tmp_path / "single").mkdir()
+    (tmp_path / "ensemble").mkdir()
+    run(problem, tmp_path / "single", lrs[0], comm_type)
+    run(problem, tmp_path / "ensemble", lrs, comm_type)
+    for lr in lrs:
+        for key in LEDGER:
+            name = f"DRR_gap_epoch2_bz5_lr{lr:.6f}_ur-1_{key}.npy"
+            single = np.load(tmp_path / "single" / f"DRR_gap_epoch2_bz5_lr{lrs[0]:.6f}_ur-1_{key}.npy")
+            np.testing.assert_allclose(np.load(tmp_path / "ensemble" / name), single)
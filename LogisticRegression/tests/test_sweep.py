@@ -0,0 +1,18 @@
+import numpy as np
+
+from sweep import job_seed
+
+
+def test_job_seed_hashes_the_whole_array():
+    model_para = np.zeros((100, 500))
+    changed = model_para.copy()
+    changed[50, 250] = 1  # hidden by the "..." of the repr
+    assert job_seed(0, dict(model_para=model_para, lr=0.1)) != job_seed(0, dict(model_para=changed, lr=0.1))
+
+
+def test_job_seed_ignores_print_options_and_path_every():
+    job = dict(model_para=np.zeros((100, 500)), lr=0.1, bz=np.int64(5))
+    seed = job_seed(0, job)
+    with np.printoptions(threshold=10**9, precision=2):
+        assert job_seed(0, job) == seed
+    assert job_seed(0, dict(job, path_every=4)) == seed
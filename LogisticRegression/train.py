@@ -20,21 +20,29 @@ from graph import (
     Grid_graph,
     Fully_connected_graph,
 )
-from analysis import error
+from analysis import error, test_error
 from Problems.logistic_regression import LR_L2
 from Problems.log_reg_cifar import LR_L4
+from Problems.multi_pair import LR_pairs
 from Optimizers import COPTIMIZER as copt
 from Optimizers import DOPTIMIZER as dopt
 from utilities import (
     load_state,
     plot_figure_path,
     spectral_norm,
+    gossip_rounds,
     print_matrix,
     init_comm_matrix,
+    geometric_coordinates,
     gen_gap_names,
     printTime,
 )
 from Algos import centralized_algo, decentralized_algo
+from sweep import Sweep_executor
+from reorder import Node_ordering, bandwidth
+from dynamic import Dynamic_topology
+from compression import Choco, Quantizer, Top_k, Random_k, Event_trigger
+from schedule import Gossip, Gossip_schedule, Consensus_control
 
 np.random.seed(0)
 trial_num = 1
@@ -51,10 +59,14 @@ for trial_idx in range(trial_num):
     # node_num = int(input("Enter number of nodes: "))
     C_node_num = node_num
 
-    # LR_L2: MNIST, LR_L4: CIFAR
-    logis_model = LR_L4(
-        node_num, limited_labels=False, balanced=True, class1=0, class2=9, #nonconvex=True, 
-    )  ## instantiate the problem class
+    # LR_L2: MNIST, LR_L4: CIFAR, LR_pairs: several class pairs of either in one run
+    multi_pair = False  # train all one-vs-one class pairs together (D algorithms only)
+    if multi_pair:
+        logis_model = LR_pairs(node_num, pairs=None, dataset="cifar10")
+    else:
+        logis_model = LR_L4(
+            node_num, limited_labels=False, balanced=True, class1=0, class2=9, #nonconvex=True, 
+        )  ## instantiate the problem class
     dim = logis_model.p  ## dimension of the model
     L = logis_model.L  ## L-smooth constant
     total_train_sample = logis_model.N  ## total number of training samples
@@ -68,22 +80,65 @@ for trial_idx in range(trial_num):
     )  # initialize the model parameter for central algorithms
     model_para_dis = np.array([cp.deepcopy(model_para_central) for i in range(node_num)])
 
-    graph = "ring"  # "solo", "ring", "grid", "exponential", "geometric", "erdos_renyi", "fully_connected"
+    graph = "ring"  # "solo", "ring", "grid", "exponential", "geometric", "erdos_renyi", "fully_connected", "one_peer_exponential", "hierarchical" (time-varying)
     # f"/afs/andrew.cmu.edu/usr7/jiaruil3/private/DRR/experiments/gen_graphs/geo/geo_7_node{node_num}.npy"
     # f"/afs/andrew.cmu.edu/usr7/jiaruil3/private/DRR/experiments/comm_matrix/comm_matrix_{node_num}.npy"  
     comm_load_path = None
-    communication_matrix = init_comm_matrix(node_num, graph, comm_load_path)
+    comm_seed = None  # seed of random graphs (geometric, erdos_renyi); seeded matrices are cached across runs
+    comm_weighting = None  # "sinkhorn", "metropolis", "metropolis_weights", "best_constant", "fmmc"; None: per-graph default
+    comm_matching = False  # gossip over one matching of the graph per round (each node talks to at most one neighbor)
+    node_reorder = None  # None, "rcm", "hilbert" (geometric graphs with a comm_seed): relabel nodes so that W is banded
+    communication_matrix = init_comm_matrix(
+        node_num, graph, comm_load_path, seed=comm_seed, weighting=comm_weighting, matching=comm_matching,
+        sparse=node_reorder is not None,
+    )
+    if node_reorder is not None and communication_matrix is not None:
+        if isinstance(communication_matrix, Gossip_schedule):
+            raise ValueError("node_reorder needs a fixed matrix, not a schedule (one_peer_exponential, hierarchical, comm_matching)")
+        if node_reorder == "rcm":
+            node_ordering = Node_ordering.rcm(communication_matrix)
+        elif node_reorder == "hilbert":
+            if graph != "geometric" or comm_seed is None or comm_load_path is not None:
+                raise ValueError("hilbert ordering needs a generated geometric graph with a comm_seed")
+            node_ordering = Node_ordering.hilbert(geometric_coordinates(node_num, comm_seed))
+        else:
+            raise ValueError("node_reorder must be None, rcm or hilbert")
+        print(f"bandwidth of W: {bandwidth(communication_matrix)} -> ", end="")
+        communication_matrix = node_ordering.matrix(communication_matrix)
+        print(bandwidth(communication_matrix))
+        node_ordering.problem(logis_model)  # data shards follow the nodes; per-node results are saved in the original labels
+        model_para_dis = node_ordering.parameters(model_para_dis)
+    comm_dynamic = False  # train on a dynamic.Dynamic_topology of the graph; add changes with at_epoch or a hook
+    if comm_dynamic and communication_matrix is not None:
+        if isinstance(communication_matrix, Gossip_schedule):
+            raise ValueError("comm_dynamic needs a fixed matrix, not a schedule (one_peer_exponential, hierarchical, comm_matching)")
+        if comm_load_path is not None:  # the weighting of a loaded matrix is only known from comm_weighting
+            dynamic_weighting = comm_weighting
+        else:  # the per-graph default of init_comm_matrix
+            dynamic_weighting = comm_weighting or ("metropolis_weights" if graph == "erdos_renyi" else "sinkhorn")
+        if dynamic_weighting not in ("metropolis", "sinkhorn"):
+            raise ValueError(f"comm_dynamic reweights with metropolis or sinkhorn only, not {dynamic_weighting}")
+        communication_matrix = Dynamic_topology(communication_matrix != 0, weighting=dynamic_weighting)
+        # communication_matrix.at_epoch(10, "remove_node", 0)
     scales = [1/32, 1/16, 1/8]
     scales = [1/4, 1/2, 3/4, 1]
     communication_rounds = [  # TODO: one shot communication/averaging
         # -1, -2, -5
         -int(total_train_sample / 16 / 10 * i) for i in scales
     ]  # list of number of communication rounds for decentralized algorithms experiments
-    comm_type = "no_comm" if communication_matrix is None else "graph_avg" # "graph_avg", "all_avg", "one_shot", "no_comm", 
+    target_contraction = None  # e.g. 1e-2: one communication of -communication_rounds gossip rounds contracts the disagreement by this factor
+    if target_contraction is not None and communication_matrix is not None:
+        communication_rounds = [-gossip_rounds(communication_matrix, target_contraction)]
+    comm_type = "no_comm" if communication_matrix is None else "graph_avg" # "graph_avg", "all_avg", "one_shot", "no_comm", "choco", "adaptive", "event"
+    compression = Choco(Top_k(0.1), gamma=0.4) if comm_type == "choco" else None  # compressor: Quantizer(bits), Top_k(fraction), Random_k(fraction)
+    adaptive = Consensus_control(target=1.0) if comm_type == "adaptive" else None  # communication_rounds are the starting points
+    event = Event_trigger(threshold=1e-3, decay=1.0) if comm_type == "event" else None
     
 
     C_algos = []  # "SGD", "CRR"
     D_algos = ["DRR"]  # "DSGD", "DRR"
+    if multi_pair and C_algos:
+        raise ValueError("multi-pair problems run the D algorithms only, leave C_algos empty")
 
     # [0.001]
     C_lr = [0.001]  # list of learning rate for central algorithms experiments
@@ -123,6 +178,15 @@ for trial_idx in range(trial_num):
     use_smoother = False  # whether to use the smoothing technique for nonconvex case
     gap_type = "grad2"  # "F", "theta1", "theta2", "grad1", "grad2", "consensus"
     comm_every_epoch = True
+    if comm_type == "adaptive" and comm_every_epoch:
+        raise ValueError("comm_type adaptive controls the gossip between steps, set comm_every_epoch = False")
+    eval_test = True  # whether to evaluate test loss and test classification error along the training path
+    eval_test_nodes = False  # whether to also evaluate every node's local model on the test set
+    ensemble = False  # run all D_lr of a (batch size, comm round) configuration in one vectorized D_RR/D_SGD loop
+    num_workers = 1  # number of worker processes running sweep configurations in parallel (1: sequential)
+    blas_threads = 1  # BLAS threads per worker process
+    schedule_sweep = True  # pack sweep jobs by estimated memory/runtime (thins trajectories that would not fit)
+    memory_budget = None  # bytes available to the sweep workers (None: 80% of the available RAM)
 
     line_formats = [  # list of line formats for plotting
         "-vb",
@@ -160,9 +224,14 @@ for trial_idx in range(trial_num):
         theta_opt = model_para_central
         theta_CSGD_0 = None
 
-    error_lr_0 = error(
-        logis_model, theta_opt, logis_model.F_val(theta_opt)
-    )  # instantiate the error class
+    if multi_pair:  # error / test_error are instantiated per pair when the pair is saved
+        error_lr_0 = error
+        test_eval = test_error if eval_test else None
+    else:
+        error_lr_0 = error(
+            logis_model, theta_opt, logis_model.F_val(theta_opt)
+        )  # instantiate the error class
+        test_eval = test_error(logis_model) if eval_test else None
 
 
     if not os.path.exists(f"{exp_log_path}"):
@@ -182,7 +251,13 @@ for trial_idx in range(trial_num):
     print(f"{'-'*50}")
     print(f"{'-'*50}")
     print(f"trial idx = {trial_idx+1}")
+    print(f"multi pair = {multi_pair}")
     print(f"{graph} Graph")
+    print(f"comm seed = {comm_seed}")
+    print(f"comm weighting = {comm_weighting}")
+    print(f"comm matching = {comm_matching}")
+    print(f"comm dynamic = {comm_dynamic}")
+    print(f"node reorder = {node_reorder}")
     print(f"node num = {node_num}")
     print(f"c_node_num = {C_node_num}")
     print(f"dim = {dim}")
@@ -195,8 +270,24 @@ for trial_idx in range(trial_num):
         print(f"Scales: {scales}")
     print(f"communication rounds = {communication_rounds}")
     print(f"communication type = {comm_type}")
+    print(f"compression = {compression}")
+    if adaptive is not None:
+        print(f"adaptive = {adaptive}")
+    if event is not None:
+        print(f"event = {event}")
     print_matrix(communication_matrix, "communication matrix")
     print(f"spec norm = {spectral_norm(communication_matrix)}")
+    if target_contraction is not None and communication_matrix is not None:
+        rounds = -communication_rounds[0]
+        if isinstance(communication_matrix, Gossip_schedule):
+            messages = sum(communication_matrix.messages(t) for t in range(rounds))
+        else:
+            messages = rounds * Gossip(communication_matrix).messages()
+        print(
+            f"target contraction = {target_contraction}: {rounds} gossip rounds per communication, "
+            f"contraction {spectral_norm(communication_matrix) ** rounds:.3g}, {messages} messages and "
+            f"{messages * dim * 8 / 1e6:.3f} MB per communication"
+        )
     print(f"C lr = {C_lr}")
     print(f"D lr = {D_lr}")
     print(f"C lr list = {C_lr_list}")
@@ -227,6 +318,13 @@ for trial_idx in range(trial_num):
     print(f"save every = {save_every}")
     print(f"plot first = {plot_first}")
     print(f"comm every epoch = {comm_every_epoch}")
+    print(f"eval test = {eval_test}")
+    print(f"eval test nodes = {eval_test_nodes}")
+    print(f"ensemble = {ensemble}")
+    print(f"num workers = {num_workers}")
+    print(f"blas threads = {blas_threads}")
+    print(f"schedule sweep = {schedule_sweep}")
+    print(f"memory budget = {memory_budget}")
 
 
     print(f"{'-'*50}", flush=True)
@@ -234,6 +332,18 @@ for trial_idx in range(trial_num):
 
     exp_name_all = []
     legend_all = []
+    executor = None
+    if num_workers > 1:
+        executor = Sweep_executor(
+            logis_model,
+            communication_matrix,
+            error_lr_0,
+            test_eval,
+            max_workers=num_workers,
+            blas_threads=blas_threads,
+            schedule=schedule_sweep,
+            memory_budget=memory_budget,
+        )
 
     for algo in C_algos:
         exp_names, legends = centralized_algo(
@@ -262,6 +372,8 @@ for trial_idx in range(trial_num):
             algo,
             gap_type,
             use_smoother,
+            test_eval=test_eval,
+            executor=executor,
         )
         exp_name_all.extend(exp_names)
         legend_all.extend(legends)
@@ -299,14 +411,26 @@ for trial_idx in range(trial_num):
             gap_type,
             use_smoother,
             comm_every_epoch,
+            test_eval=test_eval,
+            eval_nodes=eval_test_nodes,
+            executor=executor,
+            ensemble=ensemble,
+            compression=compression,
+            adaptive=adaptive,
+            event=event,
         )
         exp_name_all.extend(exp_names)
         legend_all.extend(legends)
         printTime()
+    if executor is not None:
+        executor.close()
     print(f"{'-'*50}", flush=True)
 
     info_log[f"trial{trial_idx+1}"] = []
-    for item in ["F", "theta1", "theta2", "grad1", "grad2", "consensus"]:
+    gap_items = ["F", "theta1", "theta2", "grad1", "grad2", "consensus"]
+    if eval_test:
+        gap_items += ["testloss", "testerr"]
+    for item in gap_items:
         gap_names = gen_gap_names(exp_name_all, item)
         info_log[f"trial{trial_idx+1}"].append(gap_names)
         plot_figure_path(
@@ -5,13 +5,25 @@
 ## Used to pre-set networkx-class properties
 
 import time
+import math
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
 from analysis import error
 import os
+from scipy import sparse as sp
 from graph import *
 import glob
+import json
+import hashlib
+import spectral
+import weight_opt
+from schedule import Gossip_schedule, One_peer_exponential_schedule, Hierarchical_schedule, Matching_schedule
+
+COMM_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "comm_matrix")  # default cache of init_comm_matrix
+COMM_CACHE_VERSION = 1  # bump when the generators, the weightings or the cache file format change
+SINKHORN_MAX_ITERATIONS = int(1e4)  # Sinkhorn scaling of the "sinkhorn" weighting of init_comm_matrix
+SINKHORN_TOLERANCE = 1e-7
 
 
 def monitor(name, current, total, start_time):
@@ -63,14 +75,19 @@ def plot_figure_path(
     for i, name in enumerate(exp_names):
         print(f"plotting {exp_save_path}/{name}...", flush=True)
         line = np.load(f"{exp_save_path}/{name}")
+        epochs_file = f"{exp_save_path}/{name.rsplit('_', 1)[0]}_epochs.npy"  # paths thinned by path_every
+        if os.path.exists(epochs_file):
+            xaxis = np.load(epochs_file)[: len(line)]
+        else:
+            xaxis = np.linspace(0, len(line) - 1, num=len(line), dtype=int)
         if "consensus" in name:
             line = line[1:]  # remove the first element, since it is zero
+            xaxis = xaxis[1:]
         if smooth:
             line = smoother(line, window_len=5)
 
         if plot_first == -1:
             plot_first = len(line)
-        xaxis = np.linspace(0, len(line) - 1, num=len(line), dtype=int)
         yaxis = [
             abs(point) for point in line[:plot_first:plot_every]
         ]  # the F_val could be negative
@@ -93,6 +110,16 @@ def plot_figure_path(
     print("figure plotted...")
 
 
+def path_epochs(epoch, path_every=1, length=None):
+    """
+    Epoch of every point of a decentralized training path: the initial point,
+    every path_every-th epoch and the last one (the first length points of a
+    run that stopped early).
+    """
+    epochs = np.unique(np.append(np.arange(0, epoch + 1, path_every), epoch))
+    return epochs[:length]
+
+
 def plot_figure_data(data, formats, legend, save_path, plot_every):
     print("plotting the figure...", flush=True)
     plt.clf()
@@ -209,67 +236,128 @@ def initDir(dir_path):
         os.mkdir(dir_path)
 
 
+def sinkhorn_scaling(matrix, max_iterations=100, tolerance=1e-6, c=None):
+    """
+    Scaling vectors r, c of the Sinkhorn-Knopp iteration, such that
+    diag(r) @ matrix @ diag(c) has unit column sums and row sums within
+    tolerance of 1. Dense (n, n) or (B, n, n) arrays or a sparse matrix.
+
+    @param c: initial column scaling (ones if None), e.g. the vector of a
+        previous, slightly different matrix to warm start the iteration.
+    """
+
+    def matvec(x):  # matrix @ x for every matrix of the stack
+        return np.asarray(matrix @ x[..., np.newaxis])[..., 0]
+
+    def rmatvec(x):  # matrix.T @ x for every matrix of the stack
+        return np.asarray(x[..., np.newaxis, :] @ matrix)[..., 0, :]
+
+    c = np.ones(matrix.shape[:-2] + matrix.shape[-1:]) if c is None else c
+    Ac = matvec(c)
+    for _ in range(max_iterations):
+        # Normalize rows, then columns
+        r = 1 / Ac
+        c = 1 / rmatvec(r)
+
+        # Check convergence: row sums of diag(r) @ matrix @ diag(c)
+        Ac = matvec(c)
+        if np.max(np.abs(r * Ac - 1)) < tolerance:
+            break
+    return r, c
+
+
 def convert_to_doubly_stochastic(matrix, max_iterations=100, tolerance=1e-6):
     """
     The Sinkhorn-Knopp algorithm.
 
     Converts the given matrix to a doubly stochastic matrix.
-    The conversion is done in-place.
-
-    @param matrix: The matrix to be converted.
+    Only the scaling vectors r, c of diag(r) @ matrix @ diag(c) are iterated
+    (two matrix-vector products per iteration); the matrix is rescaled once,
+    in-place, at the end. Matrices with equal row and column sums (e.g.
+    row_stochastic weights of a regular graph) are scaled in closed form.
+
+    @param matrix: The matrix to be converted: a dense (n, n) array, a dense
+        (B, n, n) stack of matrices converted together, or a scipy sparse
+        matrix (in-place for CSR, other formats are converted to CSR).
     @param max_iterations: The maximum number of iterations to perform.
-    @param tolerance: The tolerance to check convergence.
+    @param tolerance: The tolerance on the largest row-sum residual
+        |row sum - 1|, column sums are exact after every iteration.
     @return: The given matrix, converted to doubly stochastic.
     """
-    n = matrix.shape[0]  # Assuming matrix is a square matrix
-
-    # Normalize rows and columns iteratively
-    for _ in range(max_iterations):
-        prev_matrix = matrix.copy()
-
-        # Normalize rows
-        row_sums = np.sum(matrix, axis=1)
-        matrix /= row_sums[:, np.newaxis]
-
-        # Normalize columns
-        col_sums = np.sum(matrix, axis=0)
-        matrix /= col_sums
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+        col_sums = np.asarray(matrix.sum(axis=0)).ravel()
+    else:
+        row_sums = np.sum(matrix, axis=-1)
+        col_sums = np.sum(matrix, axis=-2)
+
+    if matrix.ndim == 2 and np.allclose(row_sums, row_sums[0], rtol=0, atol=tolerance) and np.allclose(
+        col_sums, row_sums[0], rtol=0, atol=tolerance
+    ):  # regular: every row and column sums to s
+        if sp.issparse(matrix):
+            matrix.data /= row_sums[0]
+        else:
+            matrix /= row_sums[0]
+        return matrix
 
-        # Check convergence
-        max_diff = np.max(np.abs(matrix - prev_matrix))
-        if max_diff < tolerance:
-            break
+    r, c = sinkhorn_scaling(matrix, max_iterations, tolerance)
 
+    if sp.issparse(matrix):
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        matrix.data *= r[rows] * c[matrix.indices]
+    else:
+        matrix *= r[..., :, np.newaxis]
+        matrix *= c[..., np.newaxis, :]
     return matrix
 
 
 def spectral_norm(comm_matrix):
+    """
+    Spectral norm of comm_matrix - 11^T / n (see spectral.second_singular_value).
+    """
     if comm_matrix is None:
         return 1
+    if isinstance(comm_matrix, Gossip_schedule):  # per-round contraction over a period
+        return comm_matrix.second_singular_value()
 
-    # ones matrix
-    ones = np.ones(comm_matrix.shape)
-    matrix = comm_matrix - ones / comm_matrix.shape[0]
-
-    # Compute the matrix A^T * A
-    ata = np.matmul(matrix.T, matrix)
+    return spectral.second_singular_value(comm_matrix)
 
-    # Calculate the eigenvalues of A^T * A
-    eigenvalues, _ = np.linalg.eig(ata)
 
-    # Find the maximum eigenvalue
-    max_eigenvalue = np.max(eigenvalues)
-
-    # Calculate the spectral norm as the square root of the maximum eigenvalue
-    spectral_norm = np.sqrt(max_eigenvalue)
-
-    return spectral_norm
+def gossip_rounds(comm_matrix, target_contraction):
+    """
+    Fewest gossip rounds per communication that contract the disagreement of
+    the nodes by target_contraction: ceil(log target / log lambda), lambda the
+    spectral norm of comm_matrix - 11^T / n. Schedules communicate whole
+    periods, with lambda the norm of the product over a period.
+    """
+    if isinstance(comm_matrix, Gossip_schedule):
+        periods = spectral.contraction_rounds(spectral_norm(comm_matrix) ** comm_matrix.period, target_contraction)
+        rounds = periods * comm_matrix.period
+    else:
+        rounds = spectral.contraction_rounds(spectral_norm(comm_matrix), target_contraction)
+    if rounds == math.inf:
+        raise ValueError("the communication matrix does not contract the disagreement (disconnected graph?)")
+    return rounds
 
 
-def print_matrix(matrix, name):
+def print_matrix(matrix, name, max_size=32):
     if matrix is None:
         print("Solo graph")
         return
+    if isinstance(matrix, Gossip_schedule):
+        print(f"{name}: {matrix}")
+        print()
+        return
+    if sp.issparse(matrix) or matrix.shape[0] > max_size:  # summary only
+        nnz = matrix.nnz if sp.issparse(matrix) else np.count_nonzero(matrix)
+        row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+        col_sums = np.asarray(matrix.sum(axis=0)).ravel()
+        print(f"{name} Matrix: {matrix.shape}, {nnz} nonzeros")
+        print(f"row sums in [{row_sums.min():.6f}, {row_sums.max():.6f}]")
+        print(f"col sums in [{col_sums.min():.6f}, {col_sums.max():.6f}]")
+        print()
+        return
     print(f"{name} Matrix:")
     for row in matrix:
         for element in row:
@@ -281,19 +369,8 @@ def print_matrix(matrix, name):
     print()
 
 
-def is_primitive(matrix, max_iterations=10000):
-    n = matrix.shape[0]  # Assuming matrix is a square matrix
-    power_counter = 1
-
-    while power_counter <= max_iterations:
-        power_matrix = np.linalg.matrix_power(matrix, power_counter)
-        if np.any(power_matrix <= 0):
-            return False
-        elif np.all(power_matrix > 0):
-            return True
-        power_counter += 1
-
-    return False
+def is_primitive(matrix):
+    return spectral.is_primitive(matrix)
 
 
 def convergence_analysis():
@@ -397,140 +474,213 @@ def convergence_analysis():
                     print(f"{algo:<5}: Error floor: {error_floor} ({net})")
 
 
-def try_geo(save_path):
+def try_geo(save_path, workers=None):
+    """
+    Find geometric graphs with matching lambda for 8, 16 and 32 nodes, using
+    the topology catalog in {save_path}/geo/catalog (built on the first call).
+    """
+    from catalog import Topology_catalog
+
     start = time.time()
 
-    np.random.seed(0)
     nodes_list = [8, 16, 32]
-    matrices_lambda = []
     search_space = int(1e5)
 
     print("generating matrices...", flush=True)
-    for node_num in nodes_list:
-        print(f"node_num = {node_num}", flush=True)
-        mat = []
-        for i in range(search_space):
-            undir_graph = Geometric_graph(node_num).undirected(0.8)
-
-            communication_matrix = Weight_matrix(undir_graph).row_stochastic()
-            communication_matrix = convert_to_doubly_stochastic(
-                communication_matrix, int(1e4), 1e-7
-            )
+    catalog = Topology_catalog(f"{save_path}/geo/catalog", "geometric", seed=0, radius=0.8)
+    catalog.build(nodes_list, search_space, workers=workers)
+    print("time elapsed: ", time.time() - start, flush=True)
 
-            norm = spectral_norm(communication_matrix)
-            mat.append((node_num, communication_matrix, norm))
+    print("searching for matching lambdas...", flush=True)
+    matches = catalog.matched(nodes_list, k=100)
+    best = matches[0]
+    print(f"min_dist = {max(best[n][1] for n in nodes_list) - min(best[n][1] for n in nodes_list)}")
+    print(f"lambdas = {', '.join(str(best[n][1]) for n in nodes_list)}", flush=True)
+    print("time elapsed: ", time.time() - start, flush=True)
 
-            if i % (search_space / 10) == 0:
-                print(f"{i / search_space * 100}% completed", flush=True)
+    # save the closest 100 matrices and their lambdas, the closest match last
+    print("saving matrices...", flush=True)
+    for idx, match in enumerate(matches[::-1]):
+        for node_num in nodes_list:
+            matrix, lambd = match[node_num]
+            np.save(f"{save_path}/geo/geo_{idx}_node{node_num}", matrix)
+            np.save(f"{save_path}/geo/geo_{idx}_node{node_num}_lambda", lambd)
 
-        matrices_lambda.append(mat)
-    print("time elapsed: ", time.time() - start, flush=True)
+    print(f"Time elapsed: {time.time() - start}", flush=True)
+    print("done", flush=True)
 
-    print("searching for min distance... (1)", flush=True)
-    min_dist = 1e10
-    min_dist_tup = None
-    min_dist_list = []
-    for idx1, mat1 in enumerate(matrices_lambda[0]):
-        for idx2, mat2 in enumerate(matrices_lambda[1]):
-            dist = abs(mat1[2] - mat2[2])
-            if dist < min_dist:
-                min_dist = dist
-                min_dist_tup = (mat1, mat2)
-                min_dist_list.append((mat1, mat2))
-        if idx1 % (search_space / 10) == 0:
-            print(f"{idx1 / search_space * 100}% completed", flush=True)
-
-    print(f"min_dist = {min_dist} (1)", flush=True)
-    print(f"lambdas = {min_dist_tup[0][2]}, {min_dist_tup[1][2]}", flush=True)
-    print("time elapsed: ", time.time() - start, flush=True)
 
-    print("searching for min distance... (2)", flush=True)
-    min_dist = 1e10
-    min_dist_tup = None
-    min_dist_list_2 = []
-    for idx3, mat3 in enumerate(matrices_lambda[2]):
-        dist1 = abs(mat3[2] - min_dist_list[-1][0][2])
-        dist2 = abs(mat3[2] - min_dist_list[-1][1][2])
-        dist = min(dist1, dist2)
-        if dist < min_dist:
-            min_dist = dist
-            min_dist_tup = (*min_dist_list[-1], mat3)
-            min_dist_list_2.append(min_dist_tup)
-        if idx3 % (search_space / 10) == 0:
-            print(f"{idx3 / search_space * 100}% completed", flush=True)
-
-    print(f"min_dist = {min_dist} (2)", flush=True)
-    print(
-        f"lambdas = {min_dist_tup[0][2]}, {min_dist_tup[1][2]}, {min_dist_tup[2][2]}",
-        flush=True,
+def comm_cache_key(node_num, graph, params, seed, weighting):
+    """
+    Content address of a generated communication matrix, including the
+    cache version and the Sinkhorn settings of sinkhorn weights.
+    """
+    if weighting == "sinkhorn":
+        params = dict(params, max_iterations=SINKHORN_MAX_ITERATIONS, tolerance=SINKHORN_TOLERANCE)
+    key = dict(
+        version=COMM_CACHE_VERSION, graph=graph, node_num=node_num, params=params, seed=seed, weighting=weighting
     )
-    print("time elapsed: ", time.time() - start, flush=True)
+    text = json.dumps(key, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:32], text
 
-    # save the closest 100 matrices
-    print("saving matrices...", flush=True)
-    if not os.path.exists(f"{save_path}/geo"):
-        os.mkdir(f"{save_path}/geo")
 
-    for idx, tup in enumerate(min_dist_list_2[-min(100, len(min_dist_list_2)) :]):
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[0]}", tup[0][1])
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[1]}", tup[1][1])
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[2]}", tup[2][1])
+def load_comm_cache(path):
+    """
+    Cached communication matrix entry: dense matrix, sparse (CSR) form and
+    spectral metadata (lambda, spectral gap, primitivity).
+    """
+    with np.load(path) as data:
+        n = data["matrix"].shape[0]
+        return dict(
+            matrix=data["matrix"],
+            sparse=sp.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=(n, n)),
+            lambd=float(data["lambd"]),
+            spectral_gap=float(data["spectral_gap"]),
+            primitive=bool(data["primitive"]),
+            key=str(data["key"]),
+        )
 
-    # save the closest 100 lambdas
-    print("saving lambdas...", flush=True)
-    for idx, tup in enumerate(min_dist_list_2[-min(100, len(min_dist_list_2)) :]):
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[0]}_lambda", tup[0][2])
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[1]}_lambda", tup[1][2])
-        np.save(f"{save_path}/geo/geo_{idx}_node{nodes_list[2]}_lambda", tup[2][2])
 
-    print(f"Time elapsed: {time.time() - start}", flush=True)
-    print("done", flush=True)
+def save_comm_cache(path, matrix, key):
+    """
+    Store a communication matrix with its sparse form and spectral metadata.
+    The file is written under a temporary name and renamed, so concurrent
+    writers (e.g. sweep workers) never expose a partial file.
+    """
+    sparse = sp.csr_matrix(matrix)
+    lambd = spectral.second_singular_value(matrix)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        matrix=matrix,
+        data=sparse.data,
+        indices=sparse.indices,
+        indptr=sparse.indptr,
+        lambd=lambd,
+        spectral_gap=1 - lambd,
+        primitive=spectral.is_primitive(sparse),
+        key=key,
+    )
+    os.replace(tmp_path, path)
 
 
-def init_comm_matrix(node_num, graph, load_path=None):
+def init_comm_matrix(
+    node_num,
+    graph,
+    load_path=None,
+    seed=None,
+    weighting=None,
+    radius=0.8,
+    epsilon=0.1,
+    cache_dir=COMM_CACHE_DIR,
+    clusters=None,
+    inter_every=4,
+    matching=False,
+    sparse=False,
+):
     """
     This function initializes the communication matrix
 
     :param node_num: number of nodes
-    :param graph: type of graph (exponential, grid, geometric, fully_connected, erdos_renyi)
+    :param graph: type of graph (exponential, grid, geometric, fully_connected, erdos_renyi), or
+        one_peer_exponential / hierarchical: a time-varying schedule.One_peer_exponential_schedule /
+        schedule.Hierarchical_schedule instead of a matrix
     :param load_path: path to load the communication matrix
+    :param seed: seed of the random graphs (geometric, erdos_renyi), drawn from np.random if None
+    :param weighting: "sinkhorn" (row stochastic + Sinkhorn), "metropolis", "metropolis_weights",
+        "best_constant" (I - alpha L, may have negative entries) or "fmmc" (fastest mixing weights);
+        None: metropolis_weights for erdos_renyi, sinkhorn otherwise
+    :param radius: connection radius of geometric graphs
+    :param epsilon: p = (1 + epsilon) log(n) / n of erdos_renyi graphs
+    :param cache_dir: directory of the matrix cache, None to disable it. Matrices are cached by
+        (graph, node_num, generator parameters, seed, weighting); random graphs only with a seed
+    :param clusters: number of clusters of hierarchical graphs (round(sqrt(node_num)) if None)
+    :param inter_every: hierarchical graphs run an inter-cluster round every inter_every rounds
+    :param matching: return the graph decomposed into matchings (schedule.Matching_schedule, pairwise averaging
+        with one neighbor per round) instead of a weighted matrix; weighting and the cache are not used
+    :param sparse: return the weighted matrix in scipy CSR format (e.g. for matrices banded by reorder.Node_ordering)
     """
     if graph == "solo":
         return None
 
-    if load_path is None:
-        if graph == "exponential":
-            undir_graph = Exponential_graph(
-                node_num
-            ).undirected()  # generate the undirected graph
-        elif graph == "grid":
-            undir_graph = Grid_graph(int(math.sqrt(node_num))).undirected()
-        elif graph == "geometric":
-            undir_graph = Geometric_graph(node_num).undirected(0.8)
-        elif graph == "ring":
-            undir_graph = Ring_graph(node_num).undirected()
-        elif graph == "fully_connected":
-            undir_graph = Fully_connected_graph(node_num).undirected()
-        elif graph == "erdos_renyi":
-            undir_graph = Erdos_Renyi_graph(node_num, 0.1).undirected()
-        else:
-            raise ValueError(
-                "graph must be exponential, grid, geometric, fully_connected, or erdos_renyi"
-            )
+    if load_path is not None:
+        communication_matrix = np.load(load_path)
+        print(f"loaded communication matrix from {load_path}")
+        return sp.csr_matrix(communication_matrix) if sparse else communication_matrix
+
+    if graph == "one_peer_exponential":  # time-varying, nothing to weight or cache
+        return One_peer_exponential_schedule(node_num)
+    if graph == "hierarchical":
+        if clusters is None:
+            clusters = max(1, round(math.sqrt(node_num)))
+        return Hierarchical_schedule(node_num, clusters, inter_every)
+
+    if weighting is None:
+        weighting = "metropolis_weights" if graph == "erdos_renyi" else "sinkhorn"
+    params = {"geometric": dict(radius=radius), "erdos_renyi": dict(epsilon=epsilon)}.get(graph, {})
+    random_graph = graph in ["geometric", "erdos_renyi"]
+    use_cache = cache_dir is not None and (seed is not None or not random_graph) and not matching
+    if use_cache:
+        digest, key = comm_cache_key(node_num, graph, params, seed if random_graph else None, weighting)
+        cache_path = f"{cache_dir}/{graph}_node{node_num}_{digest}.npz"
+        if os.path.exists(cache_path):
+            return load_comm_cache(cache_path)["sparse" if sparse else "matrix"]
+
+    rng = None if seed is None else np.random.default_rng(seed)
+    if graph == "exponential":
+        undir_graph = Exponential_graph(
+            node_num
+        ).undirected()  # generate the undirected graph
+    elif graph == "grid":
+        undir_graph = Grid_graph(int(math.sqrt(node_num))).undirected()
+    elif graph == "geometric":
+        undir_graph = Geometric_graph(node_num, rng).undirected(radius)
+    elif graph == "ring":
+        undir_graph = Ring_graph(node_num).undirected()
+    elif graph == "fully_connected":
+        undir_graph = Fully_connected_graph(node_num).undirected()
+    elif graph == "erdos_renyi":
+        undir_graph = Erdos_Renyi_graph(node_num, epsilon, rng).undirected()
+    else:
+        raise ValueError(
+            "graph must be exponential, grid, geometric, fully_connected, erdos_renyi, one_peer_exponential, or hierarchical"
+        )
 
-        if graph in ["exponential", "grid", "geometric", "ring", "fully_connected"]:
-            communication_matrix = Weight_matrix(undir_graph).row_stochastic()
-            communication_matrix = convert_to_doubly_stochastic(
-                communication_matrix, int(1e4), 1e-7
-            )
-        elif graph in ["erdos_renyi"]:
-            communication_matrix = Weight_matrix(undir_graph).metroplis_weights()
+    if matching:
+        return Matching_schedule(undir_graph)
 
+    if weighting == "sinkhorn":
+        communication_matrix = Weight_matrix(undir_graph).row_stochastic()
+        communication_matrix = convert_to_doubly_stochastic(
+            communication_matrix, SINKHORN_MAX_ITERATIONS, SINKHORN_TOLERANCE
+        )
+    elif weighting == "metropolis":
+        communication_matrix = Weight_matrix(undir_graph).metroplis()
+    elif weighting == "metropolis_weights":
+        communication_matrix = Weight_matrix(undir_graph).metroplis_weights()
+    elif weighting == "best_constant":
+        communication_matrix = weight_opt.best_constant(undir_graph)
+    elif weighting == "fmmc":
+        communication_matrix = weight_opt.fastest_mixing(undir_graph)
     else:
-        communication_matrix = np.load(load_path)
-        print(f"loaded communication matrix from {load_path}")
+        raise ValueError(
+            "weighting must be sinkhorn, metropolis, metropolis_weights, best_constant or fmmc"
+        )
 
-    return communication_matrix
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_comm_cache(cache_path, communication_matrix, key)
+    return sp.csr_matrix(communication_matrix) if sparse else communication_matrix
+
+
+def geometric_coordinates(node_num, seed, radius=0.8):
+    """
+    Node coordinates of the geometric graph that init_comm_matrix generates
+    with this seed and radius (the graph is sampled again).
+    """
+    geometric_graph = Geometric_graph(node_num, np.random.default_rng(seed))
+    geometric_graph.undirected(radius, sparse=True)
+    return geometric_graph.coordinates
 
 
 def is_doubly_stochastic(matrix):
@@ -569,8 +719,12 @@ def fix_lambda_transformation(comm_matrix, lambd, max_iterations=2, tolerance=1e
     ones = np.ones(comm_matrix.shape)
     matrix = comm_matrix - ones / comm_matrix.shape[0]
 
-    # Calculate the eigenvalues of A^T * A
-    eigenvalues, eigenvectors = np.linalg.eig(comm_matrix)
+    # Calculate the eigenvalues, in decreasing order
+    if spectral.is_symmetric(comm_matrix):
+        eigenvalues, eigenvectors = np.linalg.eigh(comm_matrix)
+        eigenvalues, eigenvectors = eigenvalues[::-1], eigenvectors[:, ::-1]
+    else:
+        eigenvalues, eigenvectors = np.linalg.eig(comm_matrix)
     # print_matrix(comm_matrix, "comm_matrix")
     # print("eigenvalues: ", eigenvalues)
     # print_matrix(eigenvectors, "eigenvectors")
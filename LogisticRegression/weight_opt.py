@@ -0,0 +1,151 @@
+########################################################################################################################
+####-----------------------------------------------Weight Optimization----------------------------------------------####
+########################################################################################################################
+
+## Used to choose symmetric weights on the edges of a given undirected graph that minimize ||W - 11^T/n||_2
+## (Xiao & Boyd, "Fast linear iterations for distributed averaging"; Boyd, Diaconis & Xiao, "Fastest mixing Markov chain
+## on a graph")
+
+import numpy as np
+from scipy import sparse as sp
+from scipy.sparse import linalg as sla
+from graph import Weight_matrix
+from spectral import DENSE_MAX_SIZE
+
+
+def edge_list(adjacency):
+    """
+    Edges i < j (self loops dropped) of an undirected dense or sparse adjacency matrix.
+    """
+    edges = sp.triu(sp.csr_matrix(adjacency), k=1).tocoo()
+    return edges.row, edges.col
+
+
+def edge_weights_matrix(n, rows, cols, weights, sparse=False):
+    """
+    W = I - sum_e w_e (e_i - e_j)(e_i - e_j)^T, symmetric with unit row sums.
+    """
+    diag = 1 - np.bincount(rows, weights=weights, minlength=n) - np.bincount(cols, weights=weights, minlength=n)
+    nodes = np.arange(n)
+    W = sp.csr_matrix(
+        (
+            np.concatenate([weights, weights, diag]),
+            (np.concatenate([rows, cols, nodes]), np.concatenate([cols, rows, nodes])),
+        ),
+        shape=(n, n),
+    )
+    return W if sparse else W.toarray()
+
+
+def laplacian_extreme_eigenvalues(adjacency):
+    """
+    Largest eigenvalue and algebraic connectivity (smallest nonzero
+    eigenvalue) of the graph Laplacian.
+    """
+    n = adjacency.shape[0]
+    A = sp.csr_matrix(adjacency, dtype=float)
+    A = A - sp.diags(A.diagonal())  # self loops do not enter the Laplacian
+    L = sp.csr_matrix(sp.diags(np.asarray(A.sum(axis=1)).ravel()) - A)
+    if n <= DENSE_MAX_SIZE:
+        eigenvalues = np.linalg.eigvalsh(L.toarray())
+        return eigenvalues[-1], eigenvalues[1]
+    largest = sla.eigsh(L, k=1, which="LA", return_eigenvectors=False)[0]
+    smallest = sla.eigsh(L, k=2, sigma=-1e-6, which="LM", return_eigenvectors=False)  # shift-invert around 0
+    return largest, np.max(smallest)
+
+
+def best_constant(adjacency):
+    """
+    W = I - alpha L with the optimal constant edge weight
+    alpha = 2 / (lambda_1(L) + lambda_{n-1}(L)). W is symmetric with unit row
+    sums but may have negative entries. Dense or sparse like adjacency.
+    """
+    largest, connectivity = laplacian_extreme_eigenvalues(adjacency)
+    return Weight_matrix(adjacency).laplacian(2 / (largest + connectivity))
+
+
+def extreme_eigenpairs(W):
+    """
+    Largest and smallest eigenvalues, with eigenvectors, of the symmetric W - 11^T/n.
+    """
+    n = W.shape[0]
+    if not sp.issparse(W):
+        eigenvalues, eigenvectors = np.linalg.eigh(W - 1 / n)
+        return eigenvalues[-1], eigenvectors[:, -1], eigenvalues[0], eigenvectors[:, 0]
+    operator = sla.LinearOperator((n, n), matvec=lambda x: W @ np.ravel(x) - np.mean(x), dtype=float)
+    top_value, top_vector = sla.eigsh(operator, k=1, which="LA")
+    bottom_value, bottom_vector = sla.eigsh(operator, k=1, which="SA")
+    return top_value[0], top_vector[:, 0], bottom_value[0], bottom_vector[:, 0]
+
+
+def project_weights(weights, rows, cols, n):
+    """
+    Make edge weights feasible for a nonnegative W: w >= 0 and, at every node,
+    sum of incident weights <= 1. Incident weights of a violating node are
+    projected onto that simplex face; weights only decrease, so nodes treated
+    earlier stay feasible.
+    """
+    weights = np.maximum(weights, 0)
+    totals = np.bincount(rows, weights=weights, minlength=n) + np.bincount(cols, weights=weights, minlength=n)
+    for node in np.flatnonzero(totals > 1):
+        incident = np.flatnonzero((rows == node) | (cols == node))
+        values = weights[incident]
+        if values.sum() <= 1:  # fixed by an earlier node
+            continue
+        ## threshold tau with sum(max(values - tau, 0)) = 1
+        ordered = np.sort(values)[::-1]
+        cumulative = np.cumsum(ordered) - 1
+        k = np.flatnonzero(ordered - cumulative / np.arange(1, len(ordered) + 1) > 0)[-1]
+        tau = cumulative[k] / (k + 1)
+        weights[incident] = np.maximum(values - tau, 0)
+    return weights
+
+
+def fastest_mixing(adjacency, max_iterations=500, step=1.0, tolerance=1e-9, verbose=False):
+    """
+    Fastest mixing doubly stochastic matrix on the edges of adjacency:
+    minimize ||W - 11^T/n||_2 over symmetric, nonnegative W with unit row
+    sums, by projected subgradient on the edge weights. The subgradient
+    with respect to w_ij is -(u_i - u_j)^2 if the norm is attained by the
+    largest eigenvalue (eigenvector u), +(v_i - v_j)^2 if by the smallest
+    (eigenvector v). Starts from the Metropolis weights; step sizes
+    step / sqrt(k + 1); the best iterate is returned, dense or sparse like
+    adjacency.
+
+    @param
+    :adjacency      undirected 0-1 adjacency matrix (self loops ignored)
+    :max_iterations number of subgradient steps
+    :step           initial step size
+    :tolerance      stop when the norm improves by less than this over 50 steps
+    """
+    sparse = sp.issparse(adjacency)
+    n = adjacency.shape[0]
+    rows, cols = edge_list(adjacency)
+    degree = np.bincount(rows, minlength=n) + np.bincount(cols, minlength=n)
+    weights = 1 / (2 * np.maximum(degree[rows], degree[cols]))  # Weight_matrix.metroplis
+    use_sparse = sparse and n > DENSE_MAX_SIZE
+
+    best_weights, best_norm, last_check = weights, np.inf, np.inf
+    for k in range(max_iterations):
+        W = edge_weights_matrix(n, rows, cols, weights, sparse=use_sparse)
+        top, u, bottom, v = extreme_eigenpairs(W)
+        norm = max(top, -bottom)
+        if norm < best_norm:
+            best_weights, best_norm = weights, norm
+        if verbose:
+            print(f"fmmc iteration {k}: {norm}")
+        if k % 50 == 49:
+            if last_check - best_norm < tolerance:
+                break
+            last_check = best_norm
+
+        if top >= -bottom:
+            subgradient = -((u[rows] - u[cols]) ** 2)
+        else:
+            subgradient = (v[rows] - v[cols]) ** 2
+        length = np.linalg.norm(subgradient)
+        if length == 0:
+            break
+        weights = project_weights(weights - step / np.sqrt(k + 1) * subgradient / length, rows, cols, n)
+
+    return edge_weights_matrix(n, rows, cols, best_weights, sparse=sparse)
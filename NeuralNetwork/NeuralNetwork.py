@@ -10,6 +10,7 @@ from Problems.my_neural_network_mnist import NN_mnist
 from Problems.my_neural_network_cifar import NN_cifar
 from graph import Weight_matrix, Geometric_graph
 from Optimizers import DOPTIMIZER as dopt
+from compression import Power
 
 ########################################################################################################################
 ####--------------------------------------------CIFAR-10 Classification---------------------------------------------####
@@ -45,15 +46,18 @@ Initializing variables
 depoch = 150
 theta_0 = np.random.randn( n,d )/10
 step_size = 0.5
+compression = None                                      # e.g. Power(rank = 2): low-rank gossip of the layers
 
 """
 Decentralized Algorithms
 """
 ## SGP
-theta_SGP = dopt.SGP(nn_1,B,step_size,int(depoch*m),theta_0)            
+ledger_SGP = {}                                                         # messages, scalars, bytes per epoch and node
+theta_SGP = dopt.SGP(nn_1,B,step_size,int(depoch*m),theta_0,compression,ledger_SGP)            
 loss_SGP, acc_SGP = NN_cifar.loss_accuracy_path(nn_1, theta_SGP)
 ## SADDOPT     
-theta_SADDOPT = dopt.SADDOPT(nn_1,B,B,step_size,int(depoch*m),theta_0) 
+ledger_SADDOPT = {}
+theta_SADDOPT = dopt.SADDOPT(nn_1,B,B,step_size,int(depoch*m),theta_0,compression,ledger_SADDOPT) 
 loss_SADDOPT, acc_SADDOPT = NN_cifar.loss_accuracy_path(nn_1, theta_SADDOPT)
 
 """
@@ -63,6 +67,9 @@ np.savetxt(f'{exp_log_path}/CIFAR_SGP_Acc.txt',acc_SGP)
 np.savetxt(f'{exp_log_path}/CIFAR_SGP_Loss.txt',loss_SGP)
 np.savetxt(f'{exp_log_path}/CIFAR_SADDOPT_Acc.txt',acc_SADDOPT)
 np.savetxt(f'{exp_log_path}/CIFAR_SADDOPT_Loss.txt',loss_SADDOPT)
+for key in ledger_SGP:
+    np.savetxt(f'{exp_log_path}/CIFAR_SGP_{key}.txt',ledger_SGP[key],fmt='%d')
+    np.savetxt(f'{exp_log_path}/CIFAR_SADDOPT_{key}.txt',ledger_SADDOPT[key],fmt='%d')
 
 """
 Save plot
@@ -7,10 +7,12 @@ import copy as cp
 import utilities as ut
 from numpy import linalg as LA
 
-def GP(prd,B,learning_rate,K,theta_0):
+def GP(prd,B,learning_rate,K,theta_0,ledger = None):
+    ## ledger: dict filled every iteration with the messages, scalars and bytes sent so far by every node (ut.record_ledger)
     theta = [cp.deepcopy( theta_0 )]
     grad = prd.networkgrad( theta[-1] )
     Y = np.ones(B.shape[1])
+    sent = ut.sent_messages( B )
     for k in range(K):
         theta.append( np.matmul( B, theta[-1] ) - learning_rate * grad ) 
         Y = np.matmul( B, Y )
@@ -18,13 +20,16 @@ def GP(prd,B,learning_rate,K,theta_0):
         z = np.matmul( LA.inv(YY), theta[-1] )
         grad = prd.networkgrad( z )
         ut.monitor('GP', k, K)
+        ut.record_ledger( ledger, theta[-1].itemsize, ((k+1) * sent, prd.dim + 1) )    ## theta and the push-sum weight
     return theta
 
-def ADDOPT(prd,B1,B2,learning_rate,K,theta_0):   
+def ADDOPT(prd,B1,B2,learning_rate,K,theta_0,ledger = None):   
+    ## ledger: dict filled every iteration with the messages, scalars and bytes sent so far by every node (ut.record_ledger)
     theta = [ cp.deepcopy(theta_0) ]
     grad = prd.networkgrad( theta[-1] )
     tracker = cp.deepcopy(grad)
     Y = np.ones(B1.shape[1])
+    sent, track_sent = ut.sent_messages( B1 ), ut.sent_messages( B2 )
     for k in range(K):
         theta.append( np.matmul( B1, theta[-1] ) - learning_rate * tracker ) 
         grad_last = cp.deepcopy(grad)
@@ -34,17 +39,28 @@ def ADDOPT(prd,B1,B2,learning_rate,K,theta_0):
         grad = prd.networkgrad( z )
         tracker = np.matmul( B2, tracker ) + grad - grad_last 
         ut.monitor('ADDOPT', k ,K)
+        ut.record_ledger( ledger, theta[-1].itemsize, ((k+1) * sent, prd.dim + 1), ((k+1) * track_sent, prd.dim) )
     return theta
 
-def SGP(prd,B,learning_rate,K,theta_0):   
+def SGP(prd,B,learning_rate,K,theta_0,compression = None,ledger = None):   
+    ## compression: e.g. compression.Power(rank), gossips low-rank factors of the layers instead of theta
+    ## ledger: dict filled every epoch with the messages, scalars and bytes sent so far by every node (ut.record_ledger)
     theta = cp.deepcopy( theta_0 )
     theta_epoch = [ cp.deepcopy(theta) ]
     sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
     grad = prd.networkgrad( theta, sample_vec )
     Y = np.ones(B.shape[1])
+    if compression is not None:
+        gossip = compression.gossip( prd, B )
+    sent = ut.sent_messages( B )
+    scalars = 1 + ( prd.dim if compression is None else gossip.scalars )    ## theta and the push-sum weight
     for k in range(K):
-        theta = np.matmul( B, theta ) - learning_rate * grad 
-        Y = np.matmul( B, Y )
+        if compression is None:
+            theta = np.matmul( B, theta ) - learning_rate * grad 
+            Y = np.matmul( B, Y )
+        else:
+            theta = gossip( theta ) - learning_rate * grad
+            Y = gossip.weights( Y )
         YY = np.diag(Y)
         z = np.matmul( LA.inv(YY), theta )
         sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
@@ -52,25 +68,41 @@ def SGP(prd,B,learning_rate,K,theta_0):
         ut.monitor('SGP', k, K)
         if (k+1) % prd.b == 0:
             theta_epoch.append( cp.deepcopy(theta) )
+            ut.record_ledger( ledger, theta.itemsize, ((k+1) * sent, scalars) )
     return theta_epoch
 
-def SADDOPT(prd,B1,B2,learning_rate,K,theta_0):   
+def SADDOPT(prd,B1,B2,learning_rate,K,theta_0,compression = None,ledger = None):   
+    ## compression: e.g. compression.Power(rank), gossips low-rank factors of the layers of theta and the tracker
+    ## ledger: dict filled every epoch with the messages, scalars and bytes sent so far by every node (ut.record_ledger)
     theta = cp.deepcopy( theta_0 )
     theta_epoch = [ cp.deepcopy(theta) ]
     sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
     grad = prd.networkgrad( theta, sample_vec )
     tracker = cp.deepcopy(grad)
     Y = np.ones(B1.shape[1])
+    if compression is not None:
+        gossip, track_gossip = compression.gossip( prd, B1 ), compression.gossip( prd, B2 )
+    sent, track_sent = ut.sent_messages( B1 ), ut.sent_messages( B2 )
+    scalars = 1 + ( prd.dim if compression is None else gossip.scalars )    ## theta and the push-sum weight
+    track_scalars = prd.dim if compression is None else track_gossip.scalars
     for k in range(K):
-        theta = np.matmul( B1, theta ) - learning_rate * tracker  
         grad_last = cp.deepcopy(grad)
-        Y = np.matmul( B1, Y )
+        if compression is None:
+            theta = np.matmul( B1, theta ) - learning_rate * tracker  
+            Y = np.matmul( B1, Y )
+        else:
+            theta = gossip( theta ) - learning_rate * tracker
+            Y = gossip.weights( Y )
         YY = np.diag(Y)
         z = np.matmul( LA.inv(YY), theta )
         sample_vec = np.array([np.random.choice(prd.data_distr[i]) for i in range(prd.n)])
         grad = prd.networkgrad( z, sample_vec )
-        tracker = np.matmul( B2, tracker ) + grad - grad_last
+        if compression is None:
+            tracker = np.matmul( B2, tracker ) + grad - grad_last
+        else:
+            tracker = track_gossip( tracker ) + grad - grad_last
         ut.monitor('SADDOPT', k, K)
         if (k+1) % prd.b == 0:
             theta_epoch.append( cp.deepcopy(theta) )
+            ut.record_ledger( ledger, theta.itemsize, ((k+1) * sent, scalars), ((k+1) * track_sent, track_scalars) )
     return theta_epoch
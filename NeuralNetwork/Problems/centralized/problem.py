@@ -133,19 +133,21 @@ class Problem(object):
         print('Distributed check succeeded!')
         return True
 
-    def generate_erdos_renyi_graph(self, prob):
+    def generate_erdos_renyi_graph(self, prob, max_tries=1000):
         # Generate connected connectivity graph according to the params.
 
         if prob < 2 / (self.n_agent - 1):
             print("Need higher probability to create a connected graph!")
             exit(-1)
-        G = nx.erdos_renyi_graph(self.n_agent, prob)
-        if nx.is_connected(G):
-            # Update number of edges of the actual graph 
-            self.n_edges = G.number_of_edges()
-            self.G = G
-        else:
-            self.generate_erdos_renyi_graph(prob)
+        for _ in range(max_tries):
+            # O(n + edges) sampler (geometric skipping) instead of one roll per pair
+            G = nx.fast_gnp_random_graph(self.n_agent, prob, seed=np.random)
+            if nx.is_connected(G):
+                # Update number of edges of the actual graph 
+                self.n_edges = G.number_of_edges()
+                self.G = G
+                return
+        raise RuntimeError(f"No connected graph with p = {prob} in {max_tries} tries")
 
     def generate_ring_graph(self):
         # Generate ring connectivity graph.
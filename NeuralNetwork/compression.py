@@ -0,0 +1,69 @@
+########################################################################################################################
+####-------------------------------------------------Compression----------------------------------------------------####
+########################################################################################################################
+
+## Used to gossip low-rank approximations of the layer weights instead of the full parameter vectors (Vogels et al.,
+## "PowerGossip: practical low-rank communication compression in decentralized deep learning")
+
+import numpy as np
+from numpy import linalg as LA
+
+
+class Power:
+    """
+        Settings of low-rank gossip for SGP / SADDOPT: rank of the factors,
+        consensus step size gamma (smaller for lower ranks) and the seed of the
+        initial power iteration vectors. gossip(prd, B) starts the gossip of
+        one parameter sequence.
+    """
+    def __init__( self, rank = 2, gamma = 0.2, seed = 0 ):
+        self.rank = rank
+        self.gamma = gamma
+        self.seed = seed
+
+    def gossip( self, prd, B ):
+        return Power_gossip( prd, B, self.rank, self.gamma, self.seed )
+
+    def __repr__( self ):
+        return f"Power(rank={self.rank}, gamma={self.gamma})"
+
+
+class Power_gossip:
+    """
+        Every node j keeps a reference h_j, known to its out-neighbors, and
+        sends a rank-r approximation P Q^T of each layer of theta_j - h_j
+        (layers from prd.unpack_w) found by one power iteration step started
+        from the previous Q: P = orth(M Q), Q = M^T P. Everyone adds P Q^T to
+        its copy of h_j, and the nodes mix the references,
+            theta = theta + gamma (B h - h),
+        which keeps the column sums of a column stochastic B, i.e. the
+        network average of push-sum. The push-sum weights, scalars, mix with
+        the same matrix I + gamma (B - I) (see weights).
+        A layer of a x b entries costs r (a + b) scalars instead of a b.
+    """
+    def __init__( self, prd, B, rank, gamma, seed = 0 ):
+        self.B = B
+        self.gamma = gamma
+        self.rank = rank
+        self.shapes = [ w.shape for w in prd.unpack_w( np.zeros( prd.dim ) ) ]
+        self.offsets = np.concatenate( [[0], np.cumsum( [ a*b for a, b in self.shapes ] )] )
+        rng = np.random.default_rng( seed )
+        self.Q = [ rng.standard_normal( (prd.n, b, rank) ) for a, b in self.shapes ]    ## warm start of every layer
+        self.reference = None                                                          ## h, (n, dim)
+        self.scalars = rank * sum( a + b for a, b in self.shapes )                     ## per message, see ut.record_ledger
+
+    def __call__( self, theta ):
+        if self.reference is None:
+            self.reference = np.zeros( theta.shape )
+        difference = theta - self.reference
+        n = theta.shape[0]
+        for l, (a, b) in enumerate( self.shapes ):
+            start, end = self.offsets[l], self.offsets[l+1]
+            M = difference[:, start:end].reshape( n, a, b )
+            P, _ = LA.qr( np.matmul( M, self.Q[l] ) )                ## (n, a, r) orthonormal columns
+            self.Q[l] = np.matmul( np.swapaxes( M, 1, 2 ), P )      ## (n, b, r)
+            self.reference[:, start:end] += np.matmul( P, np.swapaxes( self.Q[l], 1, 2 ) ).reshape( n, -1 )
+        return theta + self.gamma * ( np.matmul( self.B, self.reference ) - self.reference )
+
+    def weights( self, Y ):
+        return Y + self.gamma * ( np.matmul( self.B, Y ) - Y )
@@ -7,44 +7,60 @@
 import numpy as np
 from numpy import linalg as LA
 import math
+from scipy import sparse as sp
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+
+def strongly_connected( adjacency ):
+    """
+    Whether every node reaches every other node along the (directed) edges of
+    a dense or sparse 0-1 adjacency matrix. One O(n + edges) traversal, in
+    place of checking that LA.matrix_power(adjacency, n - 1) is positive.
+    """
+    n_components = csgraph.connected_components( sp.csr_matrix(adjacency), directed = True, \
+                                                  connection = "strong", return_labels = False )
+    return n_components == 1
 
 """
 The class of geometric graph: undirected and directed
 Two nodes are connected if they are in physical proximity
 """
 class Geometric_graph:
-    def __init__( self, number_of_nodes ):
+    def __init__( self, number_of_nodes, rng = None ):
         self.size = number_of_nodes
-    
-    def undirected(self, max_distance):
-        distance_nodes = np.zeros( (self.size, self.size) )      
-        strongly_connected = False
-        while not strongly_connected:
-            ## each row is the coordinate of a node
-            coordinate_nodes = np.random.uniform(0,1,(self.size,2))  
-            for i in range(self.size):
-                for j in range(self.size):
-                    distance_nodes[i][j] \
-                    = LA.norm(coordinate_nodes[i]-coordinate_nodes[j])
-                    ## if distance less than max_distance then connect
-            G = ( distance_nodes <= max_distance ) * 1 
-            if LA.matrix_power(G,self.size-1).all() > 0:
-                strongly_connected = True
-        return G
+        self.rng = np.random if rng is None else rng        ## np.random.Generator, or the global numpy stream
+        self.coordinates = None                              ## (size, 2) node coordinates of the last sampled graph
 
-    def directed(self, max_distance, percentage):
-        U = self.undirected(max_distance)
-        strongly_connected = False
-        while not strongly_connected:
-            for i in range(self.size):
-                for j in range(i-1):
-                    roll = np.random.uniform(0,1)
-                    if U[i][j] != 0 and U[j][i] != 0 \
-                    and roll < percentage:     ## with probabiltiy being directed 
-                        U[i][j] = 0
-            if LA.matrix_power(U,self.size-1).all() > 0:
-                strongly_connected = True
-        return U
+    def sample(self, max_distance):     ## one random geometric graph (with self loops) as a sparse 0-1 matrix
+        ## each row is the coordinate of a node
+        self.coordinates = self.rng.uniform(0,1,(self.size,2))
+        ## pairs i < j with distance less than max_distance are connected (KD-tree radius query)
+        pairs = cKDTree(self.coordinates).query_pairs(max_distance, output_type = "ndarray")
+        nodes = np.arange(self.size)
+        rows = np.concatenate( [pairs[:,0], pairs[:,1], nodes] )
+        cols = np.concatenate( [pairs[:,1], pairs[:,0], nodes] )
+        return sp.csr_matrix( (np.ones(len(rows), dtype = int), (rows, cols)), shape = (self.size,self.size) )
+
+    def undirected(self, max_distance, sparse = False, max_tries = 1000):
+        for _ in range(max_tries):
+            G = self.sample(max_distance)
+            if strongly_connected(G):
+                return G if sparse else G.toarray()
+        raise ValueError( f"no connected geometric graph with n = {self.size}, radius = {max_distance} in {max_tries} tries" )
+
+    def directed(self, max_distance, percentage, sparse = False, max_tries = 1000):
+        U = self.undirected(max_distance, sparse = True, max_tries = max_tries)
+        lower = sp.tril(U, k = -1).tocoo()                   ## edges i > j, whose reverse edge also exists
+        for _ in range(max_tries):
+            ## with probabiltiy being directed, pruning restarts from U on every attempt
+            pruned = self.rng.uniform(0,1,lower.nnz) < percentage
+            P = sp.csr_matrix( (np.ones(pruned.sum(), dtype = int), \
+                                (lower.row[pruned], lower.col[pruned])), shape = U.shape )
+            D = U - P
+            D.eliminate_zeros()
+            if strongly_connected(D):
+                return D if sparse else D.toarray()
+        raise ValueError( f"no strongly connected pruning with percentage = {percentage} of the geometric graph in {max_tries} tries" )
 
 """
 The class of exponential graphs: undirected and directed
@@ -79,69 +95,61 @@ class Exponential_graph:
 This class generates all kinds of weight matrices of interest
 """
 class Weight_matrix:
-    def __init__(self, adjacency_matrix):      ### adjacency matrix is 0-1 np array
+    """
+    Every scheme is built from the edge list (nonzeros) of the adjacency
+    matrix with vectorized degree arithmetic, in O(n + edges). The weights
+    are sparse (CSR) if the adjacency matrix is sparse and dense otherwise.
+    """
+    def __init__(self, adjacency_matrix):      ### adjacency matrix is 0-1 np array or scipy sparse matrix
         self.adj = adjacency_matrix
-        self.size = len(self.adj)              ### number of nodes
-        self.degree = self.adj.sum(axis = 0)   ### degree vector of the graph
-        
+        self.sparse = sp.issparse(adjacency_matrix)
+        self.size = self.adj.shape[0]          ### number of nodes
+        self.degree = np.asarray( self.adj.sum(axis = 0) ).ravel()   ### degree vector of the graph
+        edges = sp.coo_matrix(self.adj)
+        self.rows, self.cols, self.vals = edges.row, edges.col, edges.data   ### edge list
+        off = self.rows != self.cols
+        self.i, self.j = self.rows[off], self.cols[off]               ### edges without self loops
+
+    def build(self, rows, cols, vals):         ### duplicate (row, col) entries are summed
+        W = sp.csr_matrix( (vals, (rows, cols)), shape = (self.size,self.size) )
+        return W if self.sparse else W.toarray()
+
     def metroplis(self):
-        M = np.zeros( (self.size,self.size) )
-        for i in range(self.size):
-            for j in range(self.size):
-                if i !=j and self.adj[i][j] != 0:
-                    M[i][j] = 1/( 2*max(self.degree[i],self.degree[j]) );
-        row_sum = np.sum(M, axis = 1)
-        for i in range(self.size):
-            M[i][i] = 1 - row_sum[i]
-        return M
+        w = 1/( 2*np.maximum(self.degree[self.i], self.degree[self.j]) )
+        row_sum = np.bincount(self.i, weights = w, minlength = self.size)
+        nodes = np.arange(self.size)
+        return self.build( np.concatenate([self.i, nodes]), np.concatenate([self.j, nodes]), \
+                           np.concatenate([w, 1 - row_sum]) )
 
-    def laplacian(self,alpha):      
-        L = np.diag( self.degree ) - self.adj
-        WL = np.eye(self.size) - alpha * L
-        return WL
+    def laplacian(self,alpha):                 ### I - alpha * (diag(degree) - adj)
+        nodes = np.arange(self.size)
+        return self.build( np.concatenate([self.rows, nodes]), np.concatenate([self.cols, nodes]), \
+                           np.concatenate([alpha * self.vals, 1 - alpha * self.degree]) )
 
     def row_stochastic(self):                  
-        row_sum = np.sum(self.adj, axis = 1)
-        R = np.divide(self.adj,row_sum[:,np.newaxis])       
-        return R
+        row_sum = np.bincount(self.rows, weights = self.vals, minlength = self.size)
+        return self.build( self.rows, self.cols, self.vals / row_sum[self.rows] )
     
     def column_stochastic(self):                ### take 0-1 adjacency matrix (numpy array) as input
-        col_sum = np.sum(self.adj, axis = 0) 
-        C = np.divide(self.adj,col_sum)         ### column-stochastic weight matrix
-        return C
-    
-    def row_stoc(self):  
-        num_ele = 0
+        col_sum = np.bincount(self.cols, weights = self.vals, minlength = self.size)
+        return self.build( self.rows, self.cols, self.vals / col_sum[self.cols] )   ### column-stochastic weight matrix
+
+    def random_primitive(self):                 ### random 0-1 matrix with self loops, strongly connected hence primitive
         N = self.size
-        while num_ele != N*N:
+        strongly_connected_graph = False
+        while not strongly_connected_graph:
             mat = np.random.randint(2,size=(N, N))
-            mat = np.asmatrix(mat)
-            di = np.eye(N, dtype=int)
-            di = np.asmatrix(di)
-            A = mat + di
-            A[A>1]=1 # generation of a graph
-            mat_check = LA.matrix_power(A, N-1)
-            mat_check[mat_check>1]=1
-            num_ele = np.sum(mat_check) # to check if matrix is full
-        rowsum = np.sum(A,axis=1) # for normalization
-        mat_A = A/rowsum
-        mat_A = np.asarray(mat_A)
-        return mat_A
+            np.fill_diagonal(mat, 1)
+            A = sp.coo_matrix(mat)              # generation of a graph
+            strongly_connected_graph = strongly_connected(A)
+        return A
+    
+    def row_stoc(self):  
+        A = self.random_primitive()
+        rowsum = np.bincount(A.row, minlength = self.size)   # for normalization
+        return self.build( A.row, A.col, 1 / rowsum[A.row] )
     
     def col_stoc(self):  
-        num_ele = 0
-        N = self.size
-        while num_ele != N*N:
-            mat = np.random.randint(2,size=(N, N))
-            mat = np.asmatrix(mat)
-            di = np.eye(N, dtype=int)
-            di = np.asmatrix(di)
-            A = mat + di
-            A[A>1]=1 # generation of a graph
-            mat_check = LA.matrix_power(A, N-1)
-            mat_check[mat_check>1]=1
-            num_ele = np.sum(mat_check) # to check if matrix is full
-        colsum = np.sum(A,axis=0) # for normalization
-        mat_A = A/colsum
-        mat_B = np.asarray(mat_A)
-        return  mat_B
\ No newline at end of file
+        A = self.random_primitive()
+        colsum = np.bincount(A.col, minlength = self.size)   # for normalization
+        return self.build( A.row, A.col, 1 / colsum[A.col] )
@@ -4,6 +4,8 @@
 
 ## Used to pre-set networkx-class properties
 
+import numpy as np
+
 def monitor(name,current,total):
     if (current+1) % (total/10) == 0:
         print ( name + ' %d%% completed' % int(100*(current+1)/total), flush=True )
@@ -16,4 +18,19 @@ def nx_options():
      'width': 0.5,
      'arrows': False,
      'node_shape': 'o',}
-    return options
\ No newline at end of file
+    return options
+
+def sent_messages(B):
+    ## messages node j sends per gossip step: off-diagonal nonzeros of column j
+    return np.count_nonzero( B, axis = 0 ) - ( np.diag( B ) != 0 )
+
+def record_ledger(ledger, itemsize, *sent):
+    ## append the messages, scalars and bytes sent so far by every node to the lists of ledger (no-op if None),
+    ## sent: (messages of every node, scalars per message) of each gossiped sequence
+    if ledger is None:
+        return
+    messages = sum( m for m, scalars in sent )
+    scalars = sum( m * scalars for m, scalars in sent )
+    ledger.setdefault( 'messages', [] ).append( messages )
+    ledger.setdefault( 'scalars', [] ).append( scalars )
+    ledger.setdefault( 'bytes', [] ).append( scalars * itemsize )